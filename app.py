@@ -1,11 +1,25 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, Response, stream_with_context, g
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-import os
+from datetime import datetime, timedelta
 import json
+import os
+import socket
+import threading
+import time
 
-from document_processor import DocumentProcessor
-from search_engine import SearchEngine
+import click
+
+from document_processor import DocumentProcessor, under_prefix
+from folder_tree import FolderTree
+from folder_watcher import FolderWatcher
+from search_engine import SearchEngine, chunk_vector_id
+from fulltext_index import FullTextIndex
+from indexer import IndexingPipeline
+from metrics import metrics
+from model_server import ModelServer
+from migrations import (
+    add_missing_columns, add_missing_indexes, migrate_document_embeddings, migrate_json_chunk_embeddings,
+)
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///documents.db'
@@ -13,6 +27,51 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.secret_key = 'seu-secret-key-aqui'
 
+# Indexação: processos de extração (None = nº de núcleos), lote do encode e tamanho do bloco por commit
+app.config['INDEX_WORKERS'] = None
+app.config['INDEX_BATCH_SIZE'] = 32
+app.config['INDEX_COMMIT_EVERY'] = 200
+# OCR de PDFs escaneados: DPI, threads por documento, limite de tempo (s) e de páginas por documento
+app.config['OCR_DPI'] = 300
+app.config['OCR_WORKERS'] = 2
+app.config['OCR_TIMEOUT'] = 600
+app.config['OCR_MAX_PAGES'] = 500
+# limites de extração por tipo, mesclados sobre DocumentProcessor.EXTRACT_LIMITS
+# ex.: {'xlsx': {'max_rows': 100_000}, 'txt': {'max_bytes': 16 * 1024 * 1024}, '*': {'max_chars': 5_000_000}}
+app.config['EXTRACT_LIMITS'] = {}
+# Job sem heartbeat há mais que isso é considerado órfão (processo reiniciado) e pode ser retomado
+app.config['INDEX_JOB_STALE_SECONDS'] = 300
+# Índice vetorial: flat (exato), ivf_flat, hnsw ou ivf_pq; nprobe/ef_search trocam precisão por latência
+app.config['VECTOR_INDEX_TYPE'] = 'flat'
+app.config['VECTOR_NPROBE'] = 16
+app.config['VECTOR_EF_SEARCH'] = 64
+# Armazenamento dos embeddings no banco: float32, float16 ou int8 (quantização escalar)
+app.config['EMBEDDING_DTYPE'] = 'float32'
+# modelo de embeddings: carregado no primeiro uso; WARM_UP carrega em background ao subir o app.
+# Com MODEL_SERVER_ADDRESS ('127.0.0.1:6010' ou caminho de socket Unix) os processos usam um
+# único modelo servido por `flask --app app model-server`, em vez de uma cópia por worker.
+# MODEL_SERVER_AUTHKEY é obrigatória (sem padrão): o protocolo troca objetos pickle.
+app.config['WARM_UP'] = False
+app.config['MODEL_SERVER_ADDRESS'] = os.environ.get('MODEL_SERVER_ADDRESS')
+app.config['MODEL_SERVER_AUTHKEY'] = os.environ.get('MODEL_SERVER_AUTHKEY')
+# Resultados por página da busca por conteúdo (FTS5)
+app.config['SEARCH_PAGE_SIZE'] = 20
+# caches de consulta (LRU + TTL em segundos): embeddings das consultas e top-k da busca vetorial
+# (invalidado a cada alteração do índice); estatísticas em /api/cache/stats
+app.config['QUERY_CACHE_SIZE'] = 1024
+app.config['QUERY_CACHE_TTL'] = 3600
+app.config['RESULT_CACHE_SIZE'] = 1024
+app.config['RESULT_CACHE_TTL'] = 300
+# Watcher (`flask --app app watch PASTA...`): espera sem eventos antes de reindexar e intervalo do polling
+app.config['WATCH_DEBOUNCE_SECONDS'] = 2.0
+app.config['WATCH_POLL_INTERVAL'] = 30.0
+# remoções do watcher ficam no índice em memória; gravadas pelo próximo job ou após este intervalo
+app.config['WATCH_INDEX_SAVE_SECONDS'] = 60.0
+# Métricas (spans/contadores dos caminhos críticos) em /metrics no formato Prometheus;
+# METRICS_LOG também registra cada span/evento como uma linha JSON (logger "pesquisa.metrics")
+app.config['METRICS_ENABLED'] = True
+app.config['METRICS_LOG'] = False
+
 db = SQLAlchemy(app)
 
 # ----------------------------
@@ -20,17 +79,21 @@ db = SQLAlchemy(app)
 # ----------------------------
 class Document(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(255), nullable=False)
+    filename = db.Column(db.String(255), nullable=False, index=True)
     filepath = db.Column(db.String(500), nullable=False, unique=True)
     file_type = db.Column(db.String(10), nullable=False)
     file_size = db.Column(db.Integer)
     created_date = db.Column(db.DateTime)
     modified_date = db.Column(db.DateTime)
-    indexed_date = db.Column(db.DateTime)
-    content_text = db.Column(db.Text)
-    embeddings = db.Column(db.Text)  # JSON string dos embeddings
-    status = db.Column(db.String(20), default='pending')  # pending, indexed, error
-    folder_path = db.Column(db.String(500))
+    indexed_date = db.Column(db.DateTime, index=True)
+    # colunas pesadas carregadas só quando acessadas (listagens não trazem o texto)
+    content_text = db.deferred(db.Column(db.Text))
+    embeddings = db.deferred(db.Column(db.Text))  # legado: vetor único por documento (migrado para DocumentChunk)
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, indexed, error, missing, duplicate
+    folder_path = db.Column(db.String(500), index=True)
+    content_hash = db.Column(db.String(64), index=True)  # sha256 do arquivo (calculado no scan)
+    # cópia idêntica de outro documento: não é extraída/indexada, compartilha o conteúdo do principal
+    duplicate_of = db.Column(db.Integer, db.ForeignKey('document.id'), index=True)
 
     def to_dict(self):
         return {
@@ -43,9 +106,25 @@ class Document(db.Model):
             'modified_date': self.modified_date.isoformat() if self.modified_date else None,
             'indexed_date': self.indexed_date.isoformat() if self.indexed_date else None,
             'status': self.status,
-            'folder_path': self.folder_path
+            'folder_path': self.folder_path,
+            'content_hash': self.content_hash,
+            'duplicate_of': self.duplicate_of
         }
 
+class DocumentChunk(db.Model):
+    # ids nunca reutilizados: (count, max id) identifica o conteúdo da tabela
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False, index=True)
+    chunk_index = db.Column(db.Integer, nullable=False)
+    start_char = db.Column(db.Integer)  # posição do trecho em Document.content_text
+    end_char = db.Column(db.Integer)
+    embedding = db.Column(db.LargeBinary)  # vetor em binário (ver search_engine.encode_embedding)
+    embedding_dtype = db.Column(db.String(10))  # float32, float16 ou int8 (quantizado)
+    embedding_dim = db.Column(db.Integer)
+    embedding_model = db.Column(db.String(200))
+
 class SearchQuery(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     query_text = db.Column(db.Text, nullable=False)
@@ -53,23 +132,368 @@ class SearchQuery(db.Model):
     results_count = db.Column(db.Integer)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+class IndexJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), default='queued')  # queued, running, cancelling, cancelled, done, error
+    total = db.Column(db.Integer, default=0)
+    done_count = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    resumed_from = db.Column(db.Integer, default=0)  # processados antes da execução atual (p/ taxa)
+    owner = db.Column(db.String(100))  # host:pid que está executando
+    message = db.Column(db.Text)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    started_date = db.Column(db.DateTime)
+    heartbeat_date = db.Column(db.DateTime)
+    finished_date = db.Column(db.DateTime)
+
+    ACTIVE_STATUSES = ('queued', 'running', 'cancelling')
+
+    def to_dict(self):
+        processed = (self.done_count or 0) + (self.error_count or 0)
+        rate = 0.0
+        if self.started_date:
+            elapsed = ((self.finished_date or datetime.utcnow()) - self.started_date).total_seconds()
+            if elapsed > 0:
+                rate = (processed - (self.resumed_from or 0)) / elapsed
+        remaining = max((self.total or 0) - processed, 0)
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'done': self.done_count,
+            'errors': self.error_count,
+            'remaining': remaining,
+            'rate': round(rate, 2),  # documentos/s
+            'eta_seconds': round(remaining / rate) if rate > 0 and self.status == 'running' else None,
+            'message': self.message,
+            'created_date': self.created_date.isoformat() if self.created_date else None,
+            'started_date': self.started_date.isoformat() if self.started_date else None,
+            'finished_date': self.finished_date.isoformat() if self.finished_date else None,
+        }
+
+class Folder(db.Model):
+    # agregados por pasta mantidos pelo scan e pela indexação (folder_tree.py); sem arquivos removidos
+    __table_args__ = (db.Index('ix_folder_parent_path_path', 'parent_path', 'path'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), nullable=False, unique=True)
+    parent_path = db.Column(db.String(500))  # None = raiz
+    name = db.Column(db.String(255))
+    file_count = db.Column(db.Integer, default=0)  # arquivos diretamente na pasta
+    total_size = db.Column(db.BigInteger, default=0)
+    indexed_count = db.Column(db.Integer, default=0)
+    tree_file_count = db.Column(db.Integer, default=0)  # incluindo subpastas
+    tree_total_size = db.Column(db.BigInteger, default=0)
+    tree_indexed_count = db.Column(db.Integer, default=0)
+    child_count = db.Column(db.Integer, default=0)
+    updated_date = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'parent_path': self.parent_path,
+            'name': self.name,
+            'file_count': self.file_count,
+            'total_size': self.total_size,
+            'indexed_count': self.indexed_count,
+            'tree_file_count': self.tree_file_count,
+            'tree_total_size': self.tree_total_size,
+            'tree_indexed_count': self.tree_indexed_count,
+            'child_count': self.child_count,
+        }
+
 # ----------------------------
 # Inicializar processadores
 # ----------------------------
-document_processor = DocumentProcessor()
+document_processor = DocumentProcessor(
+    ocr_dpi=app.config['OCR_DPI'],
+    ocr_workers=app.config['OCR_WORKERS'],
+    ocr_timeout=app.config['OCR_TIMEOUT'],
+    ocr_max_pages=app.config['OCR_MAX_PAGES'],
+    ocr_cache_dir=os.path.join(app.instance_path, 'ocr_cache'),  # texto do OCR por hash do arquivo
+    extract_limits=app.config['EXTRACT_LIMITS'],
+)
 # DICA: padronize o modelo (384 dims), melhor p/ PT-BR:
-search_engine = SearchEngine(model_name="paraphrase-multilingual-MiniLM-L12-v2")
+search_engine = SearchEngine(
+    model_name="paraphrase-multilingual-MiniLM-L12-v2",
+    index_path=os.path.join(app.instance_path, 'documents.faiss'),  # ao lado do documents.db
+    index_type=app.config['VECTOR_INDEX_TYPE'],
+    nprobe=app.config['VECTOR_NPROBE'],
+    ef_search=app.config['VECTOR_EF_SEARCH'],
+    embedding_dtype=app.config['EMBEDDING_DTYPE'],
+    model_server=app.config['MODEL_SERVER_ADDRESS'],
+    model_server_authkey=(app.config['MODEL_SERVER_AUTHKEY'] or '').encode(),
+    query_cache_size=app.config['QUERY_CACHE_SIZE'],
+    query_cache_ttl=app.config['QUERY_CACHE_TTL'],
+    result_cache_size=app.config['RESULT_CACHE_SIZE'],
+    result_cache_ttl=app.config['RESULT_CACHE_TTL'],
+)
+fulltext_index = FullTextIndex()
+folder_tree = FolderTree()
+indexing_pipeline = IndexingPipeline(
+    document_processor,
+    search_engine,
+    workers=app.config['INDEX_WORKERS'],
+    batch_size=app.config['INDEX_BATCH_SIZE'],
+    commit_every=app.config['INDEX_COMMIT_EVERY'],
+)
+
+def warm_up():
+    """Carrega modelo, faiss, índice vetorial e extratores antes da primeira requisição que precisar deles."""
+    try:
+        search_engine.warm_up()
+        document_processor.warm_up()
+        with app.app_context():
+            if db.inspect(db.engine).has_table(DocumentChunk.__tablename__):
+                search_engine.ensure_index(db.session, Document, DocumentChunk)
+    except Exception as e:
+        print(f"[warm_up] Falhou: {e}")
+
+if app.config['WARM_UP']:
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+# ----------------------------
+# Métricas
+# ----------------------------
+metrics.configure(app.config['METRICS_ENABLED'], app.config['METRICS_LOG'])
+
+def _collect_state():
+    """Estado lido a cada /metrics: índice vetorial, caches, jobs e documentos por status."""
+    index = search_engine.index
+    yield 'vector_index_vectors', 'gauge', {}, index.ntotal if index is not None else 0
+    yield 'vector_index_version', 'gauge', {}, search_engine.version
+    cache_stats = search_engine.cache_stats()
+    for cache in ('embeddings', 'results'):
+        stats = cache_stats[cache]
+        yield 'query_cache_hits_total', 'counter', {'cache': cache}, stats['hits']
+        yield 'query_cache_misses_total', 'counter', {'cache': cache}, stats['misses']
+        yield 'query_cache_entries', 'gauge', {'cache': cache}, stats['size']
+    active = IndexJob.query.filter(IndexJob.status.in_(IndexJob.ACTIVE_STATUSES)).count()
+    yield 'index_jobs_active', 'gauge', {}, active
+    for status, count in document_status_counts().items():
+        yield 'documents', 'gauge', {'status': status}, count
+
+metrics.add_collector(_collect_state)
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _observe_request(response):
+    start = g.pop('request_start', None)
+    if start is not None and request.endpoint != 'metrics_endpoint':
+        metrics.observe('http_request_seconds', time.perf_counter() - start,
+                        endpoint=request.endpoint or 'unknown', method=request.method)
+    return response
+
+# ----------------------------
+# Jobs de indexação em background
+# ----------------------------
+_job_lock = threading.RLock()  # criação/retomada de jobs neste processo
+_running_jobs: set[int] = set()  # jobs com thread viva neste processo
+
+def _job_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=app.config['INDEX_JOB_STALE_SECONDS'])
+
+def _job_alive():
+    """Job ativo com heartbeat recente; sem heartbeat há INDEX_JOB_STALE_SECONDS o processo dono morreu."""
+    return db.and_(
+        IndexJob.status.in_(IndexJob.ACTIVE_STATUSES),
+        db.func.coalesce(IndexJob.heartbeat_date, IndexJob.created_date) > _stale_before(),
+    )
+
+def _heartbeat(job_id: int, stop: threading.Event):
+    # blocos longos (OCR) não podem fazer o job parecer órfão
+    interval = max(app.config['INDEX_JOB_STALE_SECONDS'] / 3, 1)
+    with app.app_context():
+        while not stop.wait(interval):
+            try:
+                IndexJob.query.filter_by(id=job_id).update(
+                    {'heartbeat_date': datetime.utcnow()}, synchronize_session=False
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[index_job] Heartbeat do job {job_id} falhou: {e}")
+
+def _run_index_job(job_id: int):
+    stop_heartbeat = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job_id, stop_heartbeat), name=f"index-job-{job_id}-heartbeat",
+                     daemon=True).start()
+    try:
+        with app.app_context():
+            job = db.session.get(IndexJob, job_id)
+            base_done, base_errors = job.done_count or 0, job.error_count or 0
+
+            def on_progress(indexed, errors):
+                job.done_count = base_done + indexed
+                job.error_count = base_errors + errors
+                job.heartbeat_date = datetime.utcnow()
+                db.session.commit()
+
+            def should_stop():
+                status = db.session.query(IndexJob.status).filter_by(id=job_id).scalar()
+                return status == 'cancelling'
+
+            def on_block(doc_ids):
+                folder_tree.add_indexed(db.session, Document, Folder, doc_ids)
+
+            try:
+                indexing_pipeline.run(db.session, Document, DocumentChunk, on_progress=on_progress,
+                                      should_stop=should_stop, on_block=on_block)
+                db.session.refresh(job)
+                job.status = 'cancelled' if job.status == 'cancelling' else 'done'
+            except Exception as e:
+                db.session.rollback()
+                job.status = 'error'
+                job.message = str(e)
+                print(f"Erro no job de indexação {job_id}: {e}")
+            job.finished_date = datetime.utcnow()
+            db.session.commit()
+
+            # o pipeline avança por id: documentos que voltaram a pending atrás do cursor
+            # (watcher durante o job) ficam para uma nova passada, se esta avançou
+            progressed = (job.done_count or 0) + (job.error_count or 0) > base_done + base_errors
+            if job.status == 'done' and progressed and Document.query.filter_by(status='pending').first():
+                start_index_job()
+    finally:
+        stop_heartbeat.set()
+        with _job_lock:
+            _running_jobs.discard(job_id)
+
+def _start_index_job(job: IndexJob):
+    pending = Document.query.filter_by(status='pending').count()
+    processed = (job.done_count or 0) + (job.error_count or 0)
+    job.status = 'running'
+    job.total = processed + pending
+    job.resumed_from = processed
+    job.owner = _job_owner()
+    job.started_date = job.heartbeat_date = datetime.utcnow()
+    job.finished_date = None
+    db.session.commit()
+    _running_jobs.add(job.id)
+    threading.Thread(target=_run_index_job, args=(job.id,), name=f"index-job-{job.id}", daemon=True).start()
+
+def _active_index_job():
+    return (
+        IndexJob.query.filter(_job_alive())
+        .order_by(IndexJob.id.desc())
+        .first()
+    )
+
+def start_index_job() -> tuple[IndexJob, bool]:
+    """Inicia um job de indexação, a menos que já exista um ativo. Retorna (job, iniciado)."""
+    with _job_lock:
+        # job de um processo que morreu: retomado em vez de bloquear novas indexações
+        resumed = resume_index_jobs()
+        if resumed:
+            return resumed[0], True
+        # INSERT condicional (atômico no banco): entre processos, só um job ativo por vez
+        jobs = IndexJob.__table__
+        result = db.session.execute(
+            jobs.insert().from_select(
+                ['status', 'created_date'],
+                db.select(db.literal('queued'), db.literal(datetime.utcnow(), db.DateTime))
+                .where(~db.session.query(IndexJob.id).filter(_job_alive()).exists()),
+            )
+        )
+        db.session.commit()
+        if not result.rowcount:
+            job = _active_index_job() or IndexJob.query.order_by(IndexJob.id.desc()).first()
+            return job, False
+        job = db.session.get(IndexJob, result.lastrowid)
+        _start_index_job(job)
+        return job, True
+
+def resume_index_jobs() -> list[IndexJob]:
+    """
+    Retoma jobs cujo processo morreu: heartbeat antigo, ou do próprio host:pid sem
+    thread viva (restart com o mesmo pid, comum em containers). Os documentos já
+    indexados são pulados; jobs que estavam sendo cancelados são finalizados.
+    """
+    resumed = []
+    with _job_lock:
+        stale = _stale_before()
+        for job in IndexJob.query.filter(IndexJob.status.in_(IndexJob.ACTIVE_STATUSES)).all():
+            if job.id in _running_jobs:
+                continue
+            beat = job.heartbeat_date or job.created_date
+            if beat and beat > stale and job.owner != _job_owner():
+                continue
+            # reivindica o job de forma atômica (evita que dois workers retomem o mesmo)
+            claimed = (
+                IndexJob.query.filter_by(id=job.id, owner=job.owner)
+                .update({'owner': _job_owner(), 'heartbeat_date': datetime.utcnow()}, synchronize_session=False)
+            )
+            db.session.commit()
+            if not claimed:
+                continue
+            db.session.refresh(job)
+            if job.status == 'cancelling':
+                job.status = 'cancelled'
+                job.finished_date = datetime.utcnow()
+                db.session.commit()
+                continue
+            _start_index_job(job)
+            resumed.append(job)
+    return resumed
+
+def _resume_after_stale_window():
+    with app.app_context():
+        resume_index_jobs()
+
+_started = False
+
+@app.before_request
+def _start_background_work():
+    """
+    Primeira requisição do processo (python app.py, flask run, gunicorn ou outro
+    servidor WSGI): prepara o banco e retoma os jobs interrompidos. Um job do
+    processo anterior (outro pid) ainda tem heartbeat recente neste momento:
+    nova tentativa quando a janela INDEX_JOB_STALE_SECONDS tiver passado.
+    """
+    global _started
+    if _started:
+        return
+    with _job_lock:
+        if not _started:
+            init_db()
+            resume_index_jobs()
+            timer = threading.Timer(app.config['INDEX_JOB_STALE_SECONDS'] + 1, _resume_after_stale_window)
+            timer.daemon = True
+            timer.start()
+            _started = True
+
+def init_db():
+    db.create_all()
+    add_missing_columns(db.session, Document)
+    add_missing_indexes(db.session, Document)
+    add_missing_columns(db.session, DocumentChunk)
+    migrate_document_embeddings(db.session, Document, DocumentChunk, search_engine.embedding_dtype)
+    migrate_json_chunk_embeddings(db.session, DocumentChunk, search_engine.embedding_dtype)
+    fulltext_index.ensure_schema(db.session)
+    folder_tree.ensure(db.session, Document, Folder)
+    # o índice FAISS é carregado pelos caminhos vetoriais (ensure_index) ou no warm_up, não aqui
 
 # ----------------------------
 # Rotas
 # ----------------------------
+def document_status_counts() -> dict:
+    """{status: quantidade} numa única consulta agrupada (lê só o índice de status)."""
+    return dict(db.session.query(Document.status, db.func.count(Document.id)).group_by(Document.status).all())
+
 @app.route('/')
 def index():
+    counts = document_status_counts()
     stats = {
-        'total_docs': Document.query.count(),
-        'indexed_docs': Document.query.filter_by(status='indexed').count(),
-        'pending_docs': Document.query.filter_by(status='pending').count(),
-        'error_docs': Document.query.filter_by(status='error').count()
+        'total_docs': sum(counts.values()),
+        'indexed_docs': counts.get('indexed', 0),
+        'pending_docs': counts.get('pending', 0),
+        'error_docs': counts.get('error', 0)
     }
     recent_docs = Document.query.order_by(Document.indexed_date.desc().nullslast()).limit(10).all()
     return render_template('index.html', stats=stats, recent_docs=recent_docs)
@@ -79,12 +503,46 @@ def scan_folder():
     if request.method == 'POST':
         folder_path = request.form.get('folder_path')
         if folder_path and os.path.exists(folder_path):
-            count = document_processor.scan_folder(folder_path, db.session, Document)
-            return jsonify({'success': True, 'message': f'{count} documentos encontrados e adicionados ao banco.'})
+            result = document_processor.scan_folder(folder_path, db.session, Document)
+            drop_document_vectors(result.changed_ids + result.missing_ids + result.duplicate_ids)
+            folder_tree.refresh(db.session, Document, Folder, result.folders)
+            return jsonify({
+                'success': True,
+                'message': (f'{result.added} documentos novos, {len(result.changed_ids)} alterados (serão reindexados), '
+                            f'{len(result.missing_ids)} removidos do disco e {len(result.duplicate_ids)} cópias '
+                            f'de documentos já conhecidos.'),
+                'added': result.added,
+                'changed': len(result.changed_ids),
+                'missing': len(result.missing_ids),
+                'duplicates': len(result.duplicate_ids),
+                'unchanged': result.unchanged,
+            })
         else:
             return jsonify({'success': False, 'message': 'Caminho da pasta inválido.'})
     return render_template('scan_folder.html')
 
+def drop_document_vectors(doc_ids: list[int], batch_size: int = 500, save: bool = True):
+    """
+    Apaga os chunks de documentos alterados/removidos e tira seus vetores do índice FAISS.
+    save=False só altera o índice em memória (a gravação fica para o job de indexação).
+    """
+    if not doc_ids:
+        return
+    search_engine.ensure_index(db.session, Document, DocumentChunk)
+    vector_ids = []
+    for i in range(0, len(doc_ids), batch_size):
+        batch = doc_ids[i:i + batch_size]
+        vector_ids += [
+            chunk_vector_id(doc_id, chunk_index)
+            for doc_id, chunk_index in db.session.query(DocumentChunk.document_id, DocumentChunk.chunk_index)
+            .filter(DocumentChunk.document_id.in_(batch))
+        ]
+        DocumentChunk.query.filter(DocumentChunk.document_id.in_(batch)).delete(synchronize_session=False)
+    db.session.commit()
+    search_engine.update_chunks(db.session, Document, DocumentChunk, removed=vector_ids)
+    if save:
+        search_engine.save_index(db.session, Document, DocumentChunk)
+
 @app.route('/documents')
 def documents():
     page = request.args.get('page', 1, type=int)
@@ -100,6 +558,10 @@ def search():
     if request.method == 'POST':
         query_text = (request.form.get('query') or '').strip()
         search_type = (request.form.get('search_type') or 'filename').strip()
+        show_duplicates = bool(request.form.get('show_duplicates'))
+        page = max(request.form.get('page', 1, type=int), 1)
+        per_page = app.config['SEARCH_PAGE_SIZE']
+        total = None
 
         if not query_text:
             flash('Digite um termo de busca.', 'warning')
@@ -109,71 +571,172 @@ def search():
         if search_type == 'filename':
             results = Document.query.filter(Document.filename.contains(query_text)).all()
         elif search_type == 'content':
-            results = Document.query.filter(Document.content_text.contains(query_text)).all()
+            results, total = content_search(query_text, limit=per_page, offset=(page - 1) * per_page)
         elif search_type == 'vector':
-            results = search_engine.vector_search(query_text, db.session, Document, limit=12)
-            # snippet opcional (se o engine tiver helper)
+            results = search_engine.vector_search(query_text, db.session, Document, DocumentChunk, limit=12)
+            # snippet dentro do melhor chunk de cada documento
+            for doc in results:
+                if getattr(doc, 'content_text', None):
+                    doc.relevant_snippet = search_engine.find_relevant_snippet(
+                        query_text, doc.content_text, span=doc.best_chunk)
+        elif search_type == 'hybrid':
+            snippets = {}
+
+            def lexical_search(k):
+                hits, _ = content_search_ids(query_text, limit=k)
+                snippets.update({doc_id: snippet for doc_id, _, snippet in hits})
+                return [doc_id for doc_id, _, _ in hits]
+
+            results = search_engine.hybrid_search(query_text, db.session, Document, DocumentChunk,
+                                                  lexical_search, limit=12)
             for doc in results:
-                if getattr(doc, 'content_text', None) and hasattr(search_engine, 'find_relevant_snippet'):
-                    doc.relevant_snippet = search_engine.find_relevant_snippet(query_text, doc.content_text)
+                if doc.id in snippets:
+                    doc.relevant_snippet = snippets[doc.id]
+                elif getattr(doc, 'content_text', None):
+                    doc.relevant_snippet = search_engine.find_relevant_snippet(
+                        query_text, doc.content_text, span=doc.best_chunk)
         else:
             results = []
+        if search_type != 'filename':
+            results = attach_duplicates(results, expand=show_duplicates)
+        # início do texto para os resultados sem trecho destacado
+        attach_previews([doc for doc in results if not getattr(doc, 'relevant_snippet', None)])
 
         # Salva histórico da consulta (sem quebrar a página se der erro)
         try:
-            sq = SearchQuery(query_text=query_text, search_type=search_type, results_count=len(results))
+            sq = SearchQuery(query_text=query_text, search_type=search_type,
+                             results_count=total if total is not None else len(results))
             db.session.add(sq)
             db.session.commit()
         except Exception:
             db.session.rollback()
 
-        return render_template('search_results.html', results=results, query=query_text, search_type=search_type)
+        pages = (total + per_page - 1) // per_page if total is not None else None
+        return render_template('search_results.html', results=results, query=query_text, search_type=search_type,
+                               total=total, page=page, pages=pages, show_duplicates=show_duplicates)
 
     return render_template('search.html')
 
+def attach_duplicates(results: list, expand: bool = False) -> list:
+    """
+    Cópias idênticas não têm texto nem vetores, então a busca já as agrupa no
+    documento principal; aqui cada resultado recebe a lista `duplicates`.
+    expand=True insere cada cópia logo após o principal (todos os caminhos).
+    """
+    ids = [doc.id for doc in results]
+    copies = {}
+    if ids:
+        for copy in Document.query.filter(Document.duplicate_of.in_(ids)).order_by(Document.filepath):
+            copies.setdefault(copy.duplicate_of, []).append(copy)
+    expanded = []
+    for doc in results:
+        doc.duplicates = copies.get(doc.id, [])
+        expanded.append(doc)
+        if expand:
+            for copy in doc.duplicates:
+                copy.duplicates = []
+                for attr in ('similarity_score', 'relevant_snippet'):
+                    if hasattr(doc, attr):
+                        setattr(copy, attr, getattr(doc, attr))
+                expanded.append(copy)
+    return expanded
+
+def attach_previews(results: list, length: int = 150):
+    """Início do texto de cada resultado (.content_preview) numa só consulta, sem carregar content_text."""
+    ids = [doc.id for doc in results]
+    previews = dict(
+        db.session.query(Document.id, db.func.substr(Document.content_text, 1, length))
+        .filter(Document.id.in_(ids))
+    ) if ids else {}
+    for doc in results:
+        doc.content_preview = previews.get(doc.id)
+
+def content_search_ids(query_text: str, limit: int, offset: int = 0):
+    """([(doc_id, score, snippet), ...], total) ranqueados pelo FTS5 (vazio se FTS5 indisponível)."""
+    return fulltext_index.search(db.session, query_text, limit=limit, offset=offset)
+
+def content_search(query_text: str, limit: int, offset: int = 0):
+    """Busca por conteúdo ranqueada (FTS5/BM25); sem FTS5 no SQLite, cai no LIKE paginado."""
+    hits, total = content_search_ids(query_text, limit=limit, offset=offset)
+    if not fulltext_index.available:
+        query = Document.query.filter(Document.content_text.contains(query_text))
+        return query.offset(offset).limit(limit).all(), query.count()
+
+    docs = {doc.id: doc for doc in Document.query.filter(Document.id.in_([doc_id for doc_id, _, _ in hits]))}
+    results = []
+    for doc_id, _, snippet in hits:
+        doc = docs.get(doc_id)
+        if doc is not None:
+            doc.relevant_snippet = snippet
+            results.append(doc)
+    return results, total
+
 @app.route('/index_documents')
 def index_documents():
-    pending_docs = Document.query.filter_by(status='pending').all()
-    indexed_count = 0
+    job, started = start_index_job()
+    if started:
+        message = f'Indexação iniciada em background (job {job.id}).'
+    else:
+        message = f'Já existe uma indexação em andamento (job {job.id}).'
+    return jsonify({'success': True, 'message': message, 'job': job.to_dict()})
 
-    for doc in pending_docs:
-        try:
-            content = document_processor.extract_content(doc.filepath, doc.file_type)
-            embeddings = search_engine.create_embeddings(content)
-
-            doc.content_text = content
-            doc.embeddings = json.dumps(embeddings.tolist()) if embeddings is not None else None
-            doc.status = 'indexed'
-            doc.indexed_date = datetime.utcnow()
-            indexed_count += 1
-        except Exception as e:
-            doc.status = 'error'
-            print(f"Erro ao indexar {doc.filepath}: {str(e)}")
+@app.route('/index_jobs', methods=['GET', 'POST'])
+def index_jobs():
+    if request.method == 'POST':
+        return index_documents()
+    resume_index_jobs()  # o painel consulta aqui: job órfão não fica "running" para sempre
+    jobs = IndexJob.query.order_by(IndexJob.id.desc()).limit(20).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+@app.route('/index_jobs/<int:job_id>')
+def index_job_status(job_id):
+    resume_index_jobs()
+    job = IndexJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
 
+@app.route('/index_jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_index_job(job_id):
+    job = IndexJob.query.get_or_404(job_id)
+    if job.status == 'queued':
+        job.status = 'cancelled'
+        job.finished_date = datetime.utcnow()
+    elif job.status == 'running':
+        job.status = 'cancelling'  # o pipeline para ao fim do bloco atual
+    else:
+        return jsonify({'success': False, 'message': f'Job {job.id} não está em execução.', 'job': job.to_dict()})
     db.session.commit()
-    return jsonify({'success': True, 'message': f'{indexed_count} documentos indexados com sucesso.'})
+    return jsonify({'success': True, 'message': f'Cancelamento solicitado (job {job.id}).', 'job': job.to_dict()})
 
 @app.route('/folder_structure')
 def folder_structure():
-    folder_paths = db.session.query(Document.folder_path).distinct().all()
-    folder_structure = {}
-    for (folder_path,) in folder_paths:
-        if folder_path:
-            parts = folder_path.split(os.sep)
-            current = folder_structure
-            for part in parts:
-                if part not in current:
-                    current[part] = {}
-                current = current[part]
-    return render_template('folder_structure.html', folder_structure=folder_structure)
+    # a árvore é carregada por subpasta (/api/folders) conforme as pastas são abertas
+    has_folders = db.session.query(Folder.id).first() is not None
+    return render_template('folder_structure.html', has_folders=has_folders)
+
+@app.route('/api/folders')
+def api_folders():
+    """
+    Subpastas de `parent` (sem `parent`: as pastas raiz) com arquivos, tamanho e
+    indexados agregados: {"folders": [...], "next_cursor": ...}; `limit` até 1000.
+    """
+    limit = min(max(request.args.get('limit', 200, type=int), 1), 1000)
+    folders, next_cursor = folder_tree.children(
+        db.session, Folder, request.args.get('parent') or None, limit=limit,
+        after=request.args.get('cursor') or None,
+    )
+    return jsonify({'folders': [folder.to_dict() for folder in folders], 'next_cursor': next_cursor})
 
 @app.route('/rag_chat', methods=['GET', 'POST'])
 def rag_chat():
     if request.method == 'POST':
         question = (request.form.get('question') or '').strip()
         if question:
-            relevant_docs = search_engine.vector_search(question, db.session, Document, limit=3)
-            context = '\n\n'.join([doc.content_text[:500] for doc in relevant_docs if getattr(doc, 'content_text', None)])
+            relevant_docs = search_engine.vector_search(question, db.session, Document, DocumentChunk, limit=3)
+            # usa o trecho (chunk) que casou com a pergunta, não só o início do documento
+            context = '\n\n'.join([
+                doc.content_text[slice(*doc.best_chunk)] if doc.best_chunk else doc.content_text[:500]
+                for doc in relevant_docs if getattr(doc, 'content_text', None)
+            ])
             answer = f"Baseado nos documentos encontrados:\n\n{context}\n\nPara uma resposta mais elaborada, integre com um modelo de linguagem."
             return render_template('rag_results.html', question=question, answer=answer, relevant_docs=relevant_docs)
     return render_template('rag_chat.html')
@@ -181,14 +744,192 @@ def rag_chat():
 @app.route('/document/<int:doc_id>')
 def view_document(doc_id):
     doc = Document.query.get_or_404(doc_id)
-    return render_template('document_detail.html', document=doc)
+    primary = db.session.get(Document, doc.duplicate_of) if doc.duplicate_of else None
+    copies = Document.query.filter_by(duplicate_of=doc.id).order_by(Document.filepath).all()
+    return render_template('document_detail.html', document=doc, primary=primary, copies=copies)
+
+API_DOCUMENT_FIELDS = ('id', 'filename', 'filepath', 'file_type', 'file_size', 'created_date', 'modified_date',
+                       'indexed_date', 'status', 'folder_path', 'content_hash', 'duplicate_of')
 
 @app.route('/api/documents')
 def api_documents():
-    documents = Document.query.all()
-    return jsonify([doc.to_dict() for doc in documents])
+    """
+    Documentos em JSON, em ordem de id, paginados por cursor (keyset):
+    ?limit=100&cursor=<next_cursor da página anterior>
+    Filtros: status, type, folder (inclui subpastas), modified_since (ISO 8601); campos: fields=id,filepath,...
+    format=ndjson: exporta tudo (ou até `limit`) em streaming, uma linha JSON por documento.
+    """
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or list(API_DOCUMENT_FIELDS)
+    unknown = [f for f in fields if f not in API_DOCUMENT_FIELDS]
+    if unknown:
+        return jsonify({'success': False, 'message': f'Campos inválidos: {", ".join(unknown)}.'}), 400
+    try:
+        criteria = document_filters(request.args)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'modified_since inválido (use ISO 8601).'}), 400
+    columns = [Document.id] + [getattr(Document, f) for f in fields]
+    cursor = request.args.get('cursor', 0, type=int)
 
-if __name__ == '__main__':
+    if request.args.get('format') == 'ndjson':
+        limit = request.args.get('limit', type=int)
+
+        def generate():
+            for row in iter_document_rows(columns, criteria, cursor, limit=limit):
+                yield json.dumps(document_row_dict(row, fields), ensure_ascii=False) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    rows = list(iter_document_rows(columns, criteria, cursor, batch_size=limit + 1, limit=limit + 1))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        'documents': [document_row_dict(row, fields) for row in rows],
+        'next_cursor': rows[-1].id if has_more else None,
+    })
+
+def document_filters(args) -> list:
+    criteria = []
+    if args.get('status'):
+        criteria.append(Document.status == args['status'])
+    if args.get('type'):
+        criteria.append(Document.file_type == args['type'].lower().lstrip('.'))
+    if args.get('folder'):
+        folder = os.path.abspath(args['folder'])
+        criteria.append(db.or_(
+            Document.folder_path == folder,
+            under_prefix(Document.folder_path, os.path.join(folder, '')),
+        ))
+    if args.get('modified_since'):
+        criteria.append(Document.modified_date >= datetime.fromisoformat(args['modified_since']))
+    return criteria
+
+def iter_document_rows(columns, criteria, after_id: int = 0, batch_size: int = 1000, limit: int | None = None):
+    """Linhas (id, *colunas) em ordem de id, lidas em lotes por keyset: memória constante."""
+    sent = 0
+    while limit is None or sent < limit:
+        n = batch_size if limit is None else min(batch_size, limit - sent)
+        rows = db.session.execute(
+            db.select(*columns).where(*criteria, Document.id > after_id).order_by(Document.id).limit(n)
+        ).all()
+        yield from rows
+        if len(rows) < n:
+            return
+        sent += n
+        after_id = rows[-1].id
+
+def document_row_dict(row, fields) -> dict:
+    return {f: (v.isoformat() if isinstance(v, datetime) else v) for f, v in zip(fields, row[1:])}
+
+# ----------------------------
+# Watcher de pastas (indexação quase em tempo real)
+# ----------------------------
+_index_save_timer = None
+
+def _save_index_later():
+    """Remoções do watcher sem job de indexação: grava o índice uma vez por intervalo, não a cada lote."""
+    global _index_save_timer
+    with _job_lock:
+        if _index_save_timer is not None:
+            return
+        _index_save_timer = threading.Timer(app.config['WATCH_INDEX_SAVE_SECONDS'], _save_unsaved_index)
+        _index_save_timer.daemon = True
+        _index_save_timer.start()
+
+def _save_unsaved_index():
+    global _index_save_timer
+    with _job_lock:
+        _index_save_timer = None
+        running = bool(_running_jobs)
+    if not search_engine.unsaved:
+        return
+    if running:
+        _save_index_later()  # o job grava o índice ao terminar; confere de novo depois
+        return
+    with app.app_context():
+        search_engine.save_index(db.session, Document, DocumentChunk)
+
+def apply_file_changes(changed_paths, deleted_paths):
+    """Callback do FolderWatcher: reconcilia os caminhos e dispara a indexação dos pendentes."""
     with app.app_context():
-        db.create_all()
-    app.run(debug=True)
+        result = document_processor.sync_paths(changed_paths, deleted_paths, db.session, Document)
+        # cada lote só altera o índice em memória: regravar (ou, com HNSW, reconstruir) o índice
+        # inteiro a cada evento custaria mais que a própria indexação
+        drop_document_vectors(result.changed_ids + result.missing_ids + result.duplicate_ids, save=False)
+        folder_tree.refresh(db.session, Document, Folder, result.folders)
+        print(f"[watch] {result.added} novos, {len(result.changed_ids)} alterados, {len(result.missing_ids)} removidos")
+        if result.added or result.changed_ids:
+            start_index_job()
+        if search_engine.unsaved:
+            _save_index_later()
+
+@app.cli.command('rebuild-folders')
+def rebuild_folders_command():
+    """Recalcula os agregados por pasta (ex.: após alterar documentos direto no banco)."""
+    init_db()
+    count = folder_tree.rebuild(db.session, Document, Folder)
+    print(f"[folders] {count} pastas recalculadas")
+
+@app.cli.command('model-server')
+@click.option('--address', default=None, help="host:porta ou socket Unix (padrão: MODEL_SERVER_ADDRESS).")
+@click.option('--allow-remote', is_flag=True, help="Permite escutar em um endereço que não seja localhost.")
+def model_server_command(address, allow_remote):
+    """Serve o modelo de embeddings para os demais processos do app."""
+    address = address or app.config['MODEL_SERVER_ADDRESS'] or '127.0.0.1:6010'
+    authkey = (app.config['MODEL_SERVER_AUTHKEY'] or '').encode()
+    ModelServer(search_engine.model_name, address, authkey, allow_remote=allow_remote).serve_forever()
+
+@app.cli.command('watch')
+@click.argument('folders', nargs=-1, required=True, type=click.Path(exists=True, file_okay=False))
+@click.option('--poll', is_flag=True, help='Usa polling mesmo com inotify disponível.')
+def watch_command(folders, poll):
+    """Observa as pastas e indexa arquivos criados/alterados/removidos."""
+    init_db()
+    # recupera o que mudou enquanto o watcher estava parado
+    for folder in folders:
+        result = document_processor.scan_folder(folder, db.session, Document)
+        drop_document_vectors(result.changed_ids + result.missing_ids + result.duplicate_ids)
+        folder_tree.refresh(db.session, Document, Folder, result.folders)
+    start_index_job()
+
+    watcher = FolderWatcher(
+        list(folders),
+        apply_file_changes,
+        extensions=DocumentProcessor.SUPPORTED_EXTENSIONS,
+        debounce_seconds=app.config['WATCH_DEBOUNCE_SECONDS'],
+        poll_interval=app.config['WATCH_POLL_INTERVAL'],
+        use_inotify=not poll,
+    )
+    print(f"[watch] Observando {', '.join(folders)} ({'inotify' if watcher.use_inotify else 'polling'}). Ctrl+C para sair.")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+
+@app.route('/api/index/recall')
+def api_index_recall():
+    """Recall@k do índice vetorial atual contra a busca exata (ex.: ?k=10&queries=200&nprobe=32)."""
+    report = search_engine.evaluate_recall(
+        db.session, Document, DocumentChunk,
+        k=request.args.get('k', 10, type=int),
+        n_queries=request.args.get('queries', 200, type=int),
+        nprobe=request.args.get('nprobe', type=int),
+        ef_search=request.args.get('ef_search', type=int),
+    )
+    return jsonify(report)
+
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    """Taxa de acerto dos caches de consulta (embeddings e resultados da busca vetorial)."""
+    return jsonify(search_engine.cache_stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas no formato texto do Prometheus (desativado: 404)."""
+    if not metrics.enabled:
+        return jsonify({'error': 'métricas desativadas (METRICS_ENABLED)'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+if __name__ == '__main__':
+    debug = True
+    # banco e jobs interrompidos: na primeira requisição (_start_background_work)
+    app.run(debug=debug)
@@ -0,0 +1 @@
+"""Benchmarks dos caminhos críticos (varredura, extração, embeddings, índice e buscas)."""
@@ -0,0 +1,147 @@
+"""
+Gerador de corpus sintético para os benchmarks: arquivos txt/docx/xlsx/pptx/pdf
+com texto pseudoaleatório (semente fixa) de tamanho e quantidade controláveis.
+
+    python -m benchmarks.corpus /tmp/corpus --count 20 --size 20000 --types txt,pdf
+"""
+import argparse
+import os
+import random
+
+from lazy_import import LazyModule
+
+docx = LazyModule("docx")
+openpyxl = LazyModule("openpyxl")
+pptx = LazyModule("pptx")
+
+CORPUS_TYPES = ("txt", "docx", "xlsx", "pptx", "pdf")
+
+# vocabulário sem acentos: o PDF mínimo abaixo usa a fonte padrão Helvetica (WinAnsi)
+_WORDS = (
+    "contrato cliente fornecedor pagamento prazo entrega nota fiscal imposto relatorio "
+    "projeto reuniao cronograma orcamento despesa receita auditoria processo documento "
+    "servico manutencao equipamento garantia proposta licitacao aditivo clausula multa "
+    "rescisao vigencia assinatura responsavel departamento financeiro juridico compras "
+    "estoque produto pedido faturamento cobranca banco conta saldo periodo anual mensal"
+).split()
+
+
+def words(rng: random.Random, n: int) -> list[str]:
+    return [rng.choice(_WORDS) for _ in range(n)]
+
+
+def paragraphs(rng: random.Random, size: int) -> list[str]:
+    """Parágrafos que somam ~`size` caracteres."""
+    out, total = [], 0
+    while total < size:
+        p = " ".join(words(rng, rng.randint(20, 80))).capitalize() + "."
+        out.append(p)
+        total += len(p) + 1
+    return out
+
+
+def write_txt(path: str, paras: list[str]):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(paras))
+
+
+def write_docx(path: str, paras: list[str]):
+    doc = docx.Document()
+    for p in paras:
+        doc.add_paragraph(p)
+    doc.save(path)
+
+
+def write_xlsx(path: str, paras: list[str]):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Dados")
+    for i, p in enumerate(paras):
+        ws.append([i, *p.split(" ", 3)])
+    wb.save(path)
+
+
+def write_pptx(path: str, paras: list[str], per_slide: int = 4):
+    prs = pptx.Presentation()
+    layout = prs.slide_layouts[1]
+    for i in range(0, len(paras), per_slide):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {i // per_slide + 1}"
+        slide.placeholders[1].text = "\n".join(paras[i:i + per_slide])
+    prs.save(path)
+
+
+def write_pdf(path: str, paras: list[str], line_chars: int = 90, lines_per_page: int = 50):
+    """PDF mínimo com texto extraível (sem dependências), várias linhas por página."""
+    lines: list[str] = []
+    for p in paras:
+        while p:
+            cut = p.rfind(" ", 0, line_chars) if len(p) > line_chars else len(p)
+            cut = cut if cut > 0 else line_chars
+            lines.append(p[:cut])
+            p = p[cut:].lstrip()
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+
+    def esc(s: str) -> str:
+        return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objs = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{p} 0 R' for p in page_ids)}] /Count {len(pages)} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id, page_lines in zip(page_ids, pages):
+        content = ("BT /F1 10 Tf 14 TL 40 810 Td " + " ".join(f"({esc(l)}) '" for l in page_lines) + " ET")
+        data = content.encode("latin-1")
+        objs.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        objs.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+WRITERS = {"txt": write_txt, "docx": write_docx, "xlsx": write_xlsx, "pptx": write_pptx, "pdf": write_pdf}
+
+
+def generate_corpus(folder: str, count: int = 20, size: int = 20_000, types=CORPUS_TYPES,
+                    seed: int = 42, subfolders: int = 4) -> list[str]:
+    """Gera `count` arquivos de cada tipo com ~`size` caracteres de texto; retorna os caminhos."""
+    rng = random.Random(seed)
+    paths = []
+    for kind in types:
+        for i in range(count):
+            sub = os.path.join(folder, f"pasta{i % subfolders}", kind)
+            os.makedirs(sub, exist_ok=True)
+            path = os.path.join(sub, f"{kind}_{i:05d}.{kind}")
+            WRITERS[kind](path, paragraphs(rng, size))
+            paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder")
+    parser.add_argument("--count", type=int, default=20, help="arquivos por tipo")
+    parser.add_argument("--size", type=int, default=20_000, help="caracteres de texto por arquivo")
+    parser.add_argument("--types", default=",".join(CORPUS_TYPES))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    paths = generate_corpus(args.folder, args.count, args.size, args.types.split(","), args.seed)
+    print(f"{len(paths)} arquivos gerados em {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
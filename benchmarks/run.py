@@ -0,0 +1,223 @@
+"""
+Benchmark dos caminhos críticos sobre um corpus sintético, usando
+DocumentProcessor, IndexingPipeline, SearchEngine e FullTextIndex
+diretamente (sem o servidor Flask), num banco SQLite temporário.
+
+    python -m benchmarks.run --count 20 --size 20000 --output bench.json
+
+Fases: scan, extract, embed, index (pipeline completo), build_index,
+vector_search, content_search, snippet. Cada uma reporta vazão, latência
+p50/p95 (por item) e o pico de RSS do processo até o fim da fase, em JSON.
+Sem `--model`, os embeddings vêm do StubEncoder (determinístico, sem download).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import Document, DocumentChunk, db
+from benchmarks.corpus import CORPUS_TYPES, generate_corpus, words
+from benchmarks.stub_encoder import StubEncoder
+from document_processor import DocumentProcessor
+from fulltext_index import FullTextIndex
+from indexer import IndexingPipeline
+from lazy_import import LazyModule, available
+from search_engine import INDEX_TYPES, SearchEngine
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sentence_transformers = LazyModule("sentence_transformers")
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Recorder:
+    """Acumula os resultados das fases no formato do relatório JSON."""
+
+    def __init__(self):
+        self.results: dict[str, dict] = {}
+
+    def record(self, name: str, seconds: float, count: int, unit: str,
+               latencies: list[float] | None = None, **extra):
+        entry = {
+            "count": count,
+            "seconds": round(seconds, 4),
+            "throughput": round(count / seconds, 2) if seconds > 0 else None,
+            "unit": f"{unit}/s",
+            "p50_ms": None,
+            "p95_ms": None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if latencies:
+            ms = np.array(latencies) * 1000
+            entry["p50_ms"] = round(float(np.percentile(ms, 50)), 3)
+            entry["p95_ms"] = round(float(np.percentile(ms, 95)), 3)
+        entry.update(extra)
+        self.results[name] = entry
+        latency = f"p50={entry['p50_ms']}ms p95={entry['p95_ms']}ms" if latencies else ""
+        print(f"[bench] {name:15} {entry['throughput']} {entry['unit']}  {latency}  rss={entry['peak_rss_mb']}MB",
+              file=sys.stderr)
+
+    def timed_each(self, name: str, items, fn, unit: str, **extra):
+        latencies = []
+        start = time.perf_counter()
+        for item in items:
+            t0 = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - t0)
+        self.record(name, time.perf_counter() - start, len(latencies), unit, latencies, **extra)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def make_engine(args) -> tuple[SearchEngine, str]:
+    if args.model and available(sentence_transformers):
+        return SearchEngine(model_name=args.model, index_type=args.index_type), args.model
+    if args.model:
+        print(f"[bench] sentence_transformers indisponível; usando StubEncoder no lugar de {args.model}",
+              file=sys.stderr)
+    engine = SearchEngine(model_name="stub-encoder", index_type=args.index_type)
+    engine._model = StubEncoder(args.dim)
+    return engine, f"stub-encoder ({args.dim} dims)"
+
+
+def run(args) -> dict:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-")
+    corpus_dir = os.path.join(workdir, "corpus")
+    rng = random.Random(args.seed)
+    rec = Recorder()
+
+    t0 = time.perf_counter()
+    paths = generate_corpus(corpus_dir, args.count, args.size, args.types, args.seed)
+    corpus_mb = sum(os.path.getsize(p) for p in paths) / 1e6
+    print(f"[bench] corpus: {len(paths)} arquivos, {corpus_mb:.1f} MB em {time.perf_counter() - t0:.1f}s",
+          file=sys.stderr)
+
+    sql_engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    db.metadata.create_all(sql_engine)
+    session = Session(sql_engine)
+    processor = DocumentProcessor(extract_limits={"*": {"max_chars": None}})
+    engine, encoder = make_engine(args)
+    fulltext = FullTextIndex()
+    fulltext.ensure_schema(session)
+
+    # varredura (cadastro dos arquivos + hash)
+    start = time.perf_counter()
+    scan = processor.scan_folder(corpus_dir, session, Document)
+    rec.record("scan", time.perf_counter() - start, scan.added, "files")
+
+    # extração, arquivo a arquivo (sem pool: latência por documento)
+    texts = {}
+    rec.timed_each("extract", paths, lambda p: texts.__setitem__(p, processor.extract_content(p, None)), "files",
+                   megabytes=round(corpus_mb, 2))
+
+    # embeddings dos chunks, em lotes
+    chunk_texts = [piece for text in texts.values() for _, _, piece in engine.iter_chunks([text])]
+    batches = [chunk_texts[i:i + args.batch_size] for i in range(0, len(chunk_texts), args.batch_size)]
+    start = time.perf_counter()
+    latencies = []
+    for batch in batches:
+        t = time.perf_counter()
+        engine.create_embeddings_batch(batch, batch_size=args.batch_size)
+        latencies.append(time.perf_counter() - t)
+    rec.record("embed", time.perf_counter() - start, len(chunk_texts), "chunks", latencies,
+               batch_size=args.batch_size)
+
+    # pipeline completo (extração em pool + chunks + embeddings + gravação + índice)
+    pipeline = IndexingPipeline(processor, engine, workers=args.workers, batch_size=args.batch_size)
+    start = time.perf_counter()
+    summary = pipeline.run(session, Document, DocumentChunk)
+    rec.record("index", time.perf_counter() - start, summary["indexed"], "docs", errors=summary["errors"])
+
+    # reconstrução do índice FAISS a partir dos blobs do banco
+    engine.reset_index()
+    start = time.perf_counter()
+    engine.build_index(session, Document, DocumentChunk)
+    rec.record("build_index", time.perf_counter() - start, engine.index.ntotal, "vectors",
+               index_type=engine.index_kind)
+
+    # consultas distintas: caches limpos para medir o caminho frio
+    queries = [" ".join(words(rng, rng.randint(2, 5))) for _ in range(args.queries)]
+    engine.embedding_cache.clear()
+    engine.result_cache.clear()
+    rec.timed_each("vector_search", queries,
+                   lambda q: engine.vector_search(q, session, Document, DocumentChunk, limit=10), "queries")
+    rec.timed_each("content_search", queries,
+                   lambda q: fulltext.search(session, q.split()[0], limit=20), "queries")
+
+    docs = session.query(Document.id, Document.content_text).filter(Document.content_text.isnot(None)).all()
+    pairs = [(q, docs[i % len(docs)][1]) for i, q in enumerate(queries)] if docs else []
+    rec.timed_each("snippet", pairs, lambda qt: engine.find_relevant_snippet(qt[0], qt[1]), "snippets")
+
+    session.close()
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "encoder": encoder,
+            "index_type": args.index_type,
+            "corpus": {"types": list(args.types), "count_per_type": args.count, "chars_per_file": args.size,
+                       "files": len(paths), "megabytes": round(corpus_mb, 2), "chunks": len(chunk_texts)},
+            "workdir": workdir,
+        },
+        "results": rec.results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20, help="arquivos por tipo")
+    parser.add_argument("--size", type=int, default=20_000, help="caracteres de texto por arquivo")
+    parser.add_argument("--types", default=",".join(CORPUS_TYPES), help="tipos do corpus (txt,docx,xlsx,pptx,pdf)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None, help="processos de extração no pipeline")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--model", default=None, help="modelo Sentence-Transformers real (padrão: StubEncoder)")
+    parser.add_argument("--dim", type=int, default=384, help="dimensão do StubEncoder")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="pasta do corpus/banco (padrão: temporária)")
+    parser.add_argument("--output", default=None, help="arquivo JSON do relatório (padrão: stdout)")
+    args = parser.parse_args()
+    args.types = [t for t in args.types.split(",") if t]
+
+    report = run(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"[bench] relatório salvo em {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import re
+import zlib
+
+import numpy as np
+
+
+class StubEncoder:
+    """
+    Codificador determinístico (hash de palavras em `dim` posições) com a mesma
+    interface usada do SentenceTransformer. Mede o custo do pipeline sem o modelo
+    real: os vetores não têm qualidade semântica, só formato e distribuição.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                h = zlib.crc32(word.encode("utf-8"))
+                out[row, h % self.dim] += 1.0 if h & 1 else -1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.where(norms == 0, 1, norms)
+        return out[0] if single else out
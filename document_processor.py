@@ -1,16 +1,34 @@
+import hashlib
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from datetime import datetime
-from docx import Document as DocxDocument
-from openpyxl import load_workbook
-from pptx import Presentation
-import PyPDF2
-import pdfplumber
-import pytesseract
+from typing import Iterator
 
-try:
-    from pdf2image import convert_from_path
-except Exception:
-    convert_from_path = None
+from sqlalchemy import and_, insert, update
+
+from lazy_import import LazyModule, available, preload
+from metrics import metrics
+
+# extratores importados no primeiro documento do tipo (não no import do app)
+docx = LazyModule("docx")
+openpyxl = LazyModule("openpyxl")
+pptx = LazyModule("pptx")
+PyPDF2 = LazyModule("PyPDF2")
+pdfplumber = LazyModule("pdfplumber")
+pytesseract = LazyModule("pytesseract")
+pdf2image = LazyModule("pdf2image")  # opcional (OCR)
+
+
+@dataclass
+class ScanResult:
+    added: int = 0
+    unchanged: int = 0
+    changed_ids: list[int] = field(default_factory=list)  # marcados como pending para reindexar
+    missing_ids: list[int] = field(default_factory=list)  # arquivos que sumiram (status missing)
+    duplicate_ids: list[int] = field(default_factory=list)  # viraram cópia de outro documento (mesmo hash)
+    folders: set[str] = field(default_factory=set)  # pastas com documentos incluídos/alterados (agregados por pasta)
 
 
 class DocumentProcessor:
@@ -25,157 +43,612 @@ class DocumentProcessor:
         ".txt": "txt",
     }
 
-    def __init__(self, poppler_path: str | None = None, tesseract_cmd: str | None = None):
+    # limites de extração por tipo (None = sem limite); "max_chars" vale para qualquer tipo
+    EXTRACT_LIMITS = {
+        "txt": {"max_bytes": 64 * 1024 * 1024},
+        "docx": {"max_paragraphs": 200_000},
+        "xlsx": {"max_rows": 500_000},
+        "pptx": {"max_pages": 2_000},
+        "pdf": {"max_pages": 5_000},
+        "*": {"max_chars": 20_000_000},
+    }
+
+    def __init__(self, poppler_path: str | None = None, tesseract_cmd: str | None = None,
+                 ocr_dpi: int = 300, ocr_workers: int | None = None, ocr_timeout: float | None = 600,
+                 ocr_max_pages: int | None = 500, ocr_cache_dir: str | None = None,
+                 extract_limits: dict | None = None):
+        """
+        Extração em streaming: cada extrator é um gerador de trechos de texto,
+        interrompido pelos limites de `extract_limits` (mesclados sobre
+        EXTRACT_LIMITS, ex.: {"xlsx": {"max_rows": 100_000}}).
+
+        OCR (PDF escaneado): páginas renderizadas e reconhecidas uma a uma em
+        `ocr_workers` threads (pdftoppm/tesseract são processos externos);
+        `ocr_timeout` é o limite por documento (segundos) e `ocr_max_pages` o teto
+        de páginas. Com `ocr_cache_dir`, o texto fica em cache pelo hash do arquivo.
+        """
         self.poppler_path = poppler_path
-        if tesseract_cmd:
-            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        self.tesseract_cmd = tesseract_cmd  # aplicado ao pytesseract no primeiro OCR
+        self.ocr_dpi = ocr_dpi
+        self.ocr_workers = ocr_workers or os.cpu_count() or 1
+        self.ocr_timeout = ocr_timeout
+        self.ocr_max_pages = ocr_max_pages
+        self.ocr_cache_dir = ocr_cache_dir
+        self.extract_limits = {k: dict(v) for k, v in self.EXTRACT_LIMITS.items()}
+        for kind, limits in (extract_limits or {}).items():
+            self.extract_limits.setdefault(kind, {}).update(limits)
+        # recriado nos processos do pool de extração
+        self._settings = {
+            "poppler_path": poppler_path,
+            "tesseract_cmd": tesseract_cmd,
+            "ocr_dpi": ocr_dpi,
+            "ocr_workers": ocr_workers,
+            "ocr_timeout": ocr_timeout,
+            "ocr_max_pages": ocr_max_pages,
+            "ocr_cache_dir": ocr_cache_dir,
+            "extract_limits": extract_limits,
+        }
 
     # -----------------------
     # Banco de dados (desacoplado)
     # -----------------------
-    def scan_folder(self, folder_path: str, session, DocumentModel) -> int:
-        count = 0
+    def scan_folder(self, folder_path: str, session, DocumentModel, batch_size: int = 1000) -> ScanResult:
+        """
+        Varredura incremental: carrega de uma vez (filepath, mtime, tamanho) já
+        conhecidos sob a pasta e compara com o os.scandir.
+        - novos: inseridos em lote (pending);
+        - alterados (mtime/tamanho) ou que reapareceram: voltam para pending;
+        - sumidos: status missing e content_text limpo (sai da busca por conteúdo).
+        """
         folder_path = os.path.abspath(folder_path)
+        prefix = os.path.join(folder_path, "")
+        known = self._known_files(
+            session, DocumentModel, under_prefix(DocumentModel.filepath, prefix)
+        )
+        with metrics.span("scan"):
+            return self._reconcile(session, DocumentModel, known, self._iter_files(folder_path), batch_size)
 
-        for root, _, files in os.walk(folder_path):
-            for fname in files:
-                ext = os.path.splitext(fname)[1].lower()
-                if ext not in self.SUPPORTED_EXTENSIONS:
-                    continue
+    def sync_paths(self, changed_paths, deleted_paths, session, DocumentModel, batch_size: int = 1000) -> ScanResult:
+        """
+        Mesma reconciliação do scan_folder, restrita aos caminhos informados
+        (eventos do FolderWatcher). Caminhos "alterados" que não existem mais
+        são tratados como removidos; em `deleted_paths`, caminhos sem extensão
+        suportada são pastas removidas (todos os arquivos sob elas somem).
+        """
+        paths, deleted_dirs = set(), set()
+        for p in set(changed_paths) | set(deleted_paths):
+            if os.path.splitext(p)[1].lower() in self.SUPPORTED_EXTENSIONS:
+                paths.add(os.path.abspath(p))
+            elif p in deleted_paths:
+                deleted_dirs.add(os.path.join(os.path.abspath(p), ""))
 
-                file_path = os.path.abspath(os.path.join(root, fname))
-                exists = session.query(DocumentModel).filter_by(filepath=file_path).first()
-                if exists:
-                    continue
+        known: dict = {}
+        ordered = sorted(paths)
+        for i in range(0, len(ordered), batch_size):
+            known.update(self._known_files(
+                session, DocumentModel, DocumentModel.filepath.in_(ordered[i:i + batch_size])
+            ))
+        for prefix in deleted_dirs:
+            known.update(self._known_files(
+                session, DocumentModel, under_prefix(DocumentModel.filepath, prefix)
+            ))
 
+        def present():
+            for file_path in ordered:
                 try:
                     st = os.stat(file_path)
-                    created = datetime.fromtimestamp(st.st_ctime)
-                    modified = datetime.fromtimestamp(st.st_mtime)
-                    size = st.st_size
-                except Exception:
-                    created = modified = None
-                    size = None
-
-                doc = DocumentModel(
-                    filename=fname,
-                    filepath=file_path,
-                    file_type=self.SUPPORTED_EXTENSIONS[ext],
-                    file_size=size,
-                    created_date=created,
-                    modified_date=modified,
-                    indexed_date=None,
-                    status="pending",
-                    folder_path=os.path.abspath(root),
+                except OSError:
+                    continue
+                yield file_path, os.path.dirname(file_path), st
+
+        with metrics.span("sync"):
+            return self._reconcile(session, DocumentModel, known, present(), batch_size)
+
+    def _known_files(self, session, DocumentModel, criterion) -> dict:
+        return {
+            filepath: (doc_id, modified, size, status, content_hash)
+            for doc_id, filepath, modified, size, status, content_hash in session.query(
+                DocumentModel.id, DocumentModel.filepath, DocumentModel.modified_date,
+                DocumentModel.file_size, DocumentModel.status, DocumentModel.content_hash,
+            ).filter(criterion)
+        }
+
+    def _reconcile(self, session, DocumentModel, known: dict, files, batch_size: int) -> ScanResult:
+        """
+        Compara os arquivos presentes (file_path, pasta, stat) com `known`
+        ({filepath: (id, mtime, tamanho, status, hash)}) e grava as diferenças em lote.
+        Novos/alterados têm o hash do conteúdo calculado; no fim, cópias idênticas
+        são agrupadas (_resolve_duplicates).
+        """
+        result = ScanResult()
+        new_rows: list[dict] = []
+        changed_rows: list[dict] = []
+        hash_rows: list[dict] = []
+        hashes: set[str] = set()  # grupos de cópias a reavaliar
+        for file_path, root, st in files:
+            try:
+                created = datetime.fromtimestamp(st.st_ctime)
+                modified = datetime.fromtimestamp(st.st_mtime)
+                size = st.st_size
+            except Exception:
+                created = modified = None
+                size = None
+
+            current = known.pop(file_path, None)
+            if current is None:
+                fname = os.path.basename(file_path)
+                new_rows.append({
+                    "filename": fname,
+                    "filepath": file_path,
+                    "file_type": self.SUPPORTED_EXTENSIONS[os.path.splitext(fname)[1].lower()],
+                    "file_size": size,
+                    "created_date": created,
+                    "modified_date": modified,
+                    "indexed_date": None,
+                    "status": "pending",
+                    "folder_path": root,
+                    "content_hash": self._content_hash(file_path),
+                })
+                hashes.add(new_rows[-1]["content_hash"])
+                result.folders.add(root)
+                if len(new_rows) >= batch_size:
+                    result.added += self._flush_inserts(session, DocumentModel, new_rows)
+                continue
+
+            doc_id, known_modified, known_size, status, known_hash = current
+            if status == "missing" or known_modified != modified or known_size != size:
+                changed_rows.append({
+                    "id": doc_id,
+                    "file_size": size,
+                    "created_date": created,
+                    "modified_date": modified,
+                    "status": "pending",
+                    "content_hash": self._content_hash(file_path),
+                    "duplicate_of": None,
+                })
+                hashes.update((known_hash, changed_rows[-1]["content_hash"]))
+                result.changed_ids.append(doc_id)
+                result.folders.add(root)
+                if len(changed_rows) >= batch_size:
+                    self._flush_updates(session, DocumentModel, changed_rows)
+            else:
+                result.unchanged += 1
+                if known_hash is None:
+                    # registro anterior ao hash: calcula uma única vez
+                    hash_rows.append({"id": doc_id, "content_hash": self._content_hash(file_path)})
+                    hashes.add(hash_rows[-1]["content_hash"])
+                    if len(hash_rows) >= batch_size:
+                        self._flush_updates(session, DocumentModel, hash_rows)
+
+        result.added += self._flush_inserts(session, DocumentModel, new_rows)
+        self._flush_updates(session, DocumentModel, changed_rows)
+        self._flush_updates(session, DocumentModel, hash_rows)
+
+        # o que sobrou em `known` não existe mais no disco
+        missing_rows = [
+            {"id": doc_id, "status": "missing", "content_text": None, "duplicate_of": None}
+            for doc_id, _, _, status, _ in known.values() if status != "missing"
+        ]
+        result.folders.update(
+            os.path.dirname(file_path) for file_path, (_, _, _, status, _) in known.items() if status != "missing"
+        )
+        hashes.update(content_hash for _, _, _, status, content_hash in known.values() if status != "missing")
+        result.missing_ids = [row["id"] for row in missing_rows]
+        for i in range(0, len(missing_rows), batch_size):
+            self._flush_updates(session, DocumentModel, missing_rows[i:i + batch_size])
+
+        hashes.discard(None)
+        duplicate_ids, promoted_ids, dup_folders = self._resolve_duplicates(session, DocumentModel, hashes, batch_size)
+        result.folders |= dup_folders
+        result.duplicate_ids = duplicate_ids
+        already = set(result.changed_ids)
+        result.changed_ids += [doc_id for doc_id in promoted_ids if doc_id not in already]
+        for outcome, count in (("added", result.added), ("changed", len(result.changed_ids)),
+                               ("missing", len(result.missing_ids)), ("duplicate", len(result.duplicate_ids)),
+                               ("unchanged", result.unchanged)):
+            metrics.inc("scan_files_total", count, result=outcome)
+        return result
+
+    def _resolve_duplicates(self, session, DocumentModel, hashes: set[str], batch_size: int):
+        """
+        Para cada hash, mantém um único documento "principal" (de preferência o já
+        indexado; senão o de menor id) e marca os demais como cópias dele
+        (status duplicate, sem texto nem vetores): extração e embeddings são
+        compartilhados. Retorna (ids que viraram cópia, ids promovidos a principal,
+        que voltam para pending, pastas desses documentos).
+        """
+        duplicate_ids: list[int] = []
+        promoted_ids: list[int] = []
+        folders: set[str] = set()
+        ordered = sorted(hashes)
+        for i in range(0, len(ordered), batch_size):
+            groups: dict[str, list] = {}
+            for row in (
+                session.query(DocumentModel.id, DocumentModel.content_hash, DocumentModel.status,
+                              DocumentModel.duplicate_of, DocumentModel.folder_path)
+                .filter(DocumentModel.content_hash.in_(ordered[i:i + batch_size]))
+                .filter(DocumentModel.status != "missing")
+                .order_by(DocumentModel.id)
+            ):
+                groups.setdefault(row.content_hash, []).append(row)
+
+            rows: list[dict] = []
+            for group in groups.values():
+                primary = (
+                    next((r for r in group if r.status == "indexed" and r.duplicate_of is None), None)
+                    or next((r for r in group if r.status != "duplicate"), None)
+                    or group[0]
                 )
-                session.add(doc)
-                count += 1
+                for r in group:
+                    if r is primary:
+                        if r.status == "duplicate" or r.duplicate_of is not None:
+                            rows.append({"id": r.id, "status": "pending", "duplicate_of": None})
+                            promoted_ids.append(r.id)
+                            folders.add(r.folder_path)
+                    elif r.status != "duplicate" or r.duplicate_of != primary.id:
+                        rows.append({"id": r.id, "status": "duplicate", "duplicate_of": primary.id,
+                                     "content_text": None, "indexed_date": None})
+                        if r.status != "duplicate":
+                            duplicate_ids.append(r.id)
+                            folders.add(r.folder_path)
+            self._flush_updates(session, DocumentModel, rows)
+        folders.discard(None)
+        return duplicate_ids, promoted_ids, folders
+
+    def _content_hash(self, file_path: str) -> str | None:
+        try:
+            return file_sha256(file_path)
+        except OSError as e:
+            print(f"[document_processor] Não foi possível calcular o hash de {file_path}: {e}")
+            return None
+
+    def _iter_files(self, folder_path: str):
+        """Gera (caminho, pasta, stat) dos arquivos suportados, recursivamente, via os.scandir."""
+        stack = [folder_path]
+        while stack:
+            root = stack.pop()
+            try:
+                with os.scandir(root) as it:
+                    entries = list(it)
+            except OSError as e:
+                print(f"[document_processor] Não foi possível ler {root}: {e}")
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in self.SUPPORTED_EXTENSIONS:
+                        continue
+                    if entry.is_file():
+                        yield os.path.abspath(entry.path), os.path.abspath(root), entry.stat()
+                except OSError:
+                    continue
 
-        session.commit()
+    def _flush_inserts(self, session, DocumentModel, rows: list[dict]) -> int:
+        count = len(rows)
+        if rows:
+            session.execute(insert(DocumentModel), rows)
+            session.commit()
+            rows.clear()
         return count
 
+    def _flush_updates(self, session, DocumentModel, rows: list[dict]):
+        if rows:
+            session.execute(update(DocumentModel), rows)
+            session.commit()
+            rows.clear()
+
     # -----------------------
     # Extração de conteúdo
     # -----------------------
+    def extract_pool(self, max_workers: int | None = None) -> ProcessPoolExecutor:
+        """
+        Pool de processos para extração em paralelo (um processo por núcleo por padrão).
+        Cada worker cria seu próprio DocumentProcessor com a mesma configuração.
+        Use com `extract_content_worker`: `pool.map(extract_content_worker, itens)`.
+        """
+        return ProcessPoolExecutor(
+            max_workers=max_workers or os.cpu_count() or 1,
+            initializer=_init_extract_worker,
+            initargs=(self._settings, metrics.settings()),
+        )
+
+    def warm_up(self):
+        """Importa agora as bibliotecas de extração (normalmente carregadas no primeiro uso)."""
+        preload(docx, openpyxl, pptx, PyPDF2, pdfplumber)
+
     def extract_content(self, file_path: str, file_type: str | None) -> str:
-        try:
-            ext = (file_type or os.path.splitext(file_path)[1].lstrip(".")).lower()
-
-            if ext == "docx":
-                return self._extract_docx(file_path)
-            if ext == "doc":
-                return "Conteúdo não disponível para arquivos .doc antigos"
-            if ext in ("xlsx", "xls"):
-                return self._extract_excel(file_path)
-            if ext in ("pptx", "ppt"):
-                return self._extract_powerpoint(file_path)
-            if ext == "pdf":
-                return self._extract_pdf(file_path)
-            if ext == "txt":
-                return self._extract_txt(file_path)
-            return ""
-        except Exception as e:
-            print(f"[document_processor] Erro ao extrair {file_path}: {e}")
-            return ""
+        return "\n".join(self.iter_content(file_path, file_type))
 
-    def _extract_txt(self, file_path: str) -> str:
+    def iter_content(self, file_path: str, file_type: str | None) -> Iterator[str]:
+        """
+        Gera o texto do documento em trechos (unidos por "\n" formam o texto
+        completo), sem materializar o arquivo inteiro; para em `max_chars`.
+        """
+        ext = (file_type or os.path.splitext(file_path)[1].lstrip(".")).lower()
+        extractors = {
+            "docx": self._extract_docx,
+            "xlsx": self._extract_excel,
+            "xls": self._extract_excel,
+            "pptx": self._extract_powerpoint,
+            "ppt": self._extract_powerpoint,
+            "pdf": self._extract_pdf,
+            "txt": self._extract_txt,
+        }
+        if ext == "doc":
+            yield "Conteúdo não disponível para arquivos .doc antigos"
+            return
+        extractor = extractors.get(ext)
+        if extractor is None:
+            return
+
+        budget = self._limit("*", "max_chars")
+        with metrics.span("extract", type=ext):
+            try:
+                for segment in extractor(file_path):
+                    if budget is not None:
+                        if budget <= 0:
+                            print(f"[document_processor] Limite de {self._limit('*', 'max_chars')} caracteres: {file_path}")
+                            metrics.inc("extract_truncated_total", type=ext)
+                            return
+                        segment = segment[:budget]
+                        budget -= len(segment) + 1
+                    yield segment
+            except Exception as e:
+                print(f"[document_processor] Erro ao extrair {file_path}: {e}")
+                metrics.inc("extract_errors_total", type=ext)
+                metrics.event("extract_error", type=ext, path=file_path, error=str(e))
+
+    def _limit(self, kind: str, name: str) -> int | None:
+        return self.extract_limits.get(kind, {}).get(name)
+
+    def _extract_txt(self, file_path: str, block_size: int = 1 << 20) -> Iterator[str]:
+        # blocos de linhas inteiras: o "\n" final de cada bloco vira o separador
+        max_bytes = self._limit("txt", "max_bytes")
         try:
             with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                return f.read()
+                carry, read = "", 0
+                while max_bytes is None or read < max_bytes:
+                    block = f.read(block_size if max_bytes is None else min(block_size, max_bytes - read))
+                    if not block:
+                        break
+                    read += len(block)
+                    block = carry + block
+                    cut = block.rfind("\n")
+                    if cut < 0:
+                        carry = block
+                        if len(carry) >= block_size:  # linha gigante: entrega assim mesmo
+                            yield carry
+                            carry = ""
+                        continue
+                    yield block[:cut]
+                    carry = block[cut + 1:]
+                if carry:
+                    yield carry
         except Exception as e:
             print(f"[document_processor] TXT falhou {file_path}: {e}")
-            return ""
-
-    def _extract_docx(self, file_path: str) -> str:
-        doc = DocxDocument(file_path)
-        return "\n".join(p.text for p in doc.paragraphs if p.text)
-
-    def _extract_excel(self, file_path: str) -> str:
-        wb = load_workbook(file_path, data_only=True)
-        parts: list[str] = []
-        for sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            parts.append(f"--- Planilha: {sheet_name} ---")
-            for row in ws.iter_rows(values_only=True):
-                vals = [str(c) for c in row if c is not None]
-                if vals:
-                    parts.append("\t".join(vals))
-        return "\n".join(parts)
-
-    def _extract_powerpoint(self, file_path: str) -> str:
-        prs = Presentation(file_path)
-        parts: list[str] = []
+
+    def _extract_docx(self, file_path: str) -> Iterator[str]:
+        max_paragraphs = self._limit("docx", "max_paragraphs")
+        doc = docx.Document(file_path)
+        count = 0
+        for p in doc.paragraphs:
+            if p.text:
+                yield p.text
+                count += 1
+                if max_paragraphs is not None and count >= max_paragraphs:
+                    break
+
+    def _extract_excel(self, file_path: str) -> Iterator[str]:
+        # read_only: as linhas são lidas do XML sob demanda, sem carregar a planilha toda
+        max_rows = self._limit("xlsx", "max_rows")
+        wb = openpyxl.load_workbook(file_path, data_only=True, read_only=True)
+        rows = 0
+        try:
+            for sheet_name in wb.sheetnames:
+                ws = wb[sheet_name]
+                yield f"--- Planilha: {sheet_name} ---"
+                for row in ws.iter_rows(values_only=True):
+                    vals = [str(c) for c in row if c is not None]
+                    if vals:
+                        yield "\t".join(vals)
+                    rows += 1
+                    if max_rows is not None and rows >= max_rows:
+                        print(f"[document_processor] Limite de {max_rows} linhas: {file_path}")
+                        return
+        finally:
+            wb.close()
+
+    def _extract_powerpoint(self, file_path: str) -> Iterator[str]:
+        max_slides = self._limit("pptx", "max_pages")
+        prs = pptx.Presentation(file_path)
         for i, slide in enumerate(prs.slides, start=1):
-            parts.append(f"--- Slide {i} ---")
+            if max_slides is not None and i > max_slides:
+                break
+            yield f"--- Slide {i} ---"
             for shape in slide.shapes:
                 if getattr(shape, "has_text_frame", False) and shape.text_frame:
                     txt = shape.text_frame.text
                     if txt:
-                        parts.append(txt)
+                        yield txt
                 elif hasattr(shape, "text"):
                     if shape.text:
-                        parts.append(shape.text)
-        return "\n".join(parts)
+                        yield shape.text
 
-    def _extract_pdf(self, file_path: str) -> str:
-        parts: list[str] = []
+    def _extract_pdf(self, file_path: str) -> Iterator[str]:
+        # página a página; um método só é tentado se os anteriores não renderam texto
+        max_pages = self._limit("pdf", "max_pages")
+        found = False
 
         # 1) pdfplumber (digital)
         try:
             with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
+                for page in pdf.pages[:max_pages]:
                     txt = page.extract_text(x_tolerance=2, y_tolerance=2) or ""
+                    page.close()  # libera o cache de objetos da página
                     txt = txt.strip()
                     if txt:
-                        parts.append(txt)
+                        found = True
+                        yield txt
         except Exception as e:
             print(f"[document_processor] pdfplumber falhou {file_path}: {e}")
 
         # 2) PyPDF2 (fallback)
-        if not parts:
+        if not found:
             try:
                 with open(file_path, "rb") as fh:
                     reader = PyPDF2.PdfReader(fh)
-                    for p in reader.pages:
+                    for p in reader.pages[:max_pages]:
                         txt = p.extract_text() or ""
                         txt = txt.strip()
                         if txt:
-                            parts.append(txt)
+                            found = True
+                            yield txt
             except Exception as e:
                 print(f"[document_processor] PyPDF2 falhou {file_path}: {e}")
 
         # 3) OCR (escaneado)
-        if not parts and convert_from_path is not None:
+        if not found and available(pdf2image):
             try:
-                images = convert_from_path(file_path, dpi=300, poppler_path=self.poppler_path)
-                ocr_parts = []
-                for img in images:
-                    txt = pytesseract.image_to_string(img, lang="por+eng", config="--oem 3 --psm 6")
-                    if txt and txt.strip():
-                        ocr_parts.append(txt.strip())
-                if ocr_parts:
-                    parts.extend(ocr_parts)
+                pages = self._ocr_pdf(file_path)
             except Exception as e:
                 print(f"[document_processor] OCR falhou {file_path}: {e}")
+                pages = []
+            yield from pages
+
+    # -----------------------
+    # OCR
+    # -----------------------
+    def _ocr_pdf(self, file_path: str) -> list[str]:
+        """OCR página a página em paralelo, com memória limitada (uma imagem por worker)."""
+        cache_path = self._ocr_cache_path(file_path)
+        if cache_path and os.path.exists(cache_path):
+            metrics.inc("ocr_cache_hits_total")
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return [p for p in f.read().split("\f") if p]
+        with metrics.span("ocr"):
+            return self._ocr_pages(file_path, cache_path)
+
+    def _ocr_pages(self, file_path: str, cache_path: str | None) -> list[str]:
+        if self.tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = self.tesseract_cmd
+        n_pages = pdf2image.pdfinfo_from_path(file_path, poppler_path=self.poppler_path)["Pages"]
+        if self.ocr_max_pages and n_pages > self.ocr_max_pages:
+            print(f"[document_processor] OCR limitado a {self.ocr_max_pages} de {n_pages} páginas: {file_path}")
+            n_pages = self.ocr_max_pages
+        deadline = time.monotonic() + self.ocr_timeout if self.ocr_timeout else None
+
+        texts: dict[int, str] = {}
+        pages = iter(range(1, n_pages + 1))
+        in_flight: dict = {}
+        timed_out = False
+        pool = ThreadPoolExecutor(max_workers=self.ocr_workers, thread_name_prefix="ocr")
+        try:
+            def submit_next():
+                page = next(pages, None)
+                if page is not None:
+                    in_flight[pool.submit(self._ocr_page, file_path, page, deadline)] = page
+                metrics.set_gauge("ocr_pages_in_flight", len(in_flight))
+
+            for _ in range(self.ocr_workers):
+                submit_next()
+            while in_flight:
+                timeout = max(deadline - time.monotonic(), 0) if deadline else None
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    timed_out = True
+                    print(f"[document_processor] OCR excedeu {self.ocr_timeout}s, texto parcial: {file_path}")
+                    metrics.inc("ocr_timeouts_total")
+                    metrics.event("ocr_timeout", path=file_path, pages_done=len(texts), pages=n_pages)
+                    break
+                for fut in done:
+                    page = in_flight.pop(fut)
+                    try:
+                        txt = fut.result()
+                    except Exception as e:
+                        print(f"[document_processor] OCR falhou na página {page} de {file_path}: {e}")
+                        metrics.inc("ocr_page_errors_total")
+                        txt = ""
+                    if txt:
+                        texts[page] = txt
+                    submit_next()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            metrics.set_gauge("ocr_pages_in_flight", 0)
+
+        result = [texts[p] for p in sorted(texts)]
+        if cache_path and not timed_out:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write("\f".join(result))
+            os.replace(cache_path + ".tmp", cache_path)
+        return result
+
+    def _ocr_page(self, file_path: str, page: int, deadline: float | None) -> str:
+        remaining = (lambda: max(deadline - time.monotonic(), 1)) if deadline else (lambda: None)
+        with metrics.span("ocr_page"):
+            images = pdf2image.convert_from_path(
+                file_path, dpi=self.ocr_dpi, first_page=page, last_page=page,
+                poppler_path=self.poppler_path, timeout=remaining(),
+            )
+            try:
+                parts = []
+                for img in images:
+                    txt = pytesseract.image_to_string(img, lang="por+eng", config="--oem 3 --psm 6",
+                                                      timeout=remaining() or 0)
+                    if txt and txt.strip():
+                        parts.append(txt.strip())
+                metrics.inc("ocr_pages_total")
+                return "\n".join(parts)
+            finally:
+                for img in images:
+                    img.close()
+
+    def _ocr_cache_path(self, file_path: str) -> str | None:
+        if not self.ocr_cache_dir:
+            return None
+        key = f"{file_sha256(file_path)}-{self.ocr_dpi}"
+        return os.path.join(self.ocr_cache_dir, key[:2], f"{key}.txt")
+
+
+def under_prefix(column, prefix: str):
+    """
+    Caminhos que começam com `prefix`, diferenciando maiúsculas (o LIKE do SQLite
+    não diferencia: /data/Docs casaria com /data/docs). Intervalo [prefix, prefix
+    com o último caractere seguinte), que também usa o índice da coluna.
+    """
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# -----------------------
+# Workers do pool de extração (precisam ser top-level p/ pickle)
+# -----------------------
+_worker_processor: DocumentProcessor | None = None
+
+
+def _init_extract_worker(settings: dict, metrics_settings: dict | None = None):
+    global _worker_processor
+    _worker_processor = DocumentProcessor(**settings)
+    if metrics_settings:
+        metrics.configure(**metrics_settings)
+        metrics.drain()  # com fork o worker herda o que o processo pai já registrou
+
 
-        return "\n\n".join(parts).strip()
+def extract_content_worker(item: tuple[int, str, str | None]) -> tuple[int, str, dict | None]:
+    """
+    Recebe (doc_id, file_path, file_type) e devolve (doc_id, texto, métricas);
+    as métricas do worker vão junto para o processo principal (metrics.merge).
+    """
+    doc_id, file_path, file_type = item
+    processor = _worker_processor or DocumentProcessor()
+    text = processor.extract_content(file_path, file_type)
+    return doc_id, text, metrics.drain()
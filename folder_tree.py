@@ -0,0 +1,183 @@
+import os
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, delete, func, insert, update
+
+from metrics import metrics
+
+
+def ancestors(path: str):
+    """A pasta e todas as pastas acima dela, até a raiz do sistema de arquivos."""
+    while path:
+        yield path
+        parent = os.path.dirname(path)
+        path = parent if parent != path else None
+
+
+def _depth(path: str) -> int:
+    return path.rstrip(os.sep).count(os.sep)
+
+
+class FolderTree:
+    """
+    Agregados por pasta (tabela Folder), desacoplado do app: arquivos, tamanho e
+    indexados de cada pasta, diretamente nela e na subárvore inteira.
+    - O scan recalcula só as pastas que mudaram (ScanResult.folders) e sobe os
+      totais da subárvore pelos ancestrais, nível a nível.
+    - A indexação só soma os novos indexados de cada bloco (sem recontar pastas),
+      na mesma transação que grava o bloco.
+    - A árvore é lida por subpasta (children), com paginação por caminho.
+    Arquivos removidos do disco (status missing) não entram nos agregados.
+    Recebe db.session e as classes Document/Folder por parâmetro.
+    """
+
+    def ensure(self, session, DocumentModel, FolderModel):
+        """Banco anterior à tabela Folder: calcula os agregados uma vez."""
+        if session.query(FolderModel.id).first() is None and session.query(DocumentModel.id).first() is not None:
+            self.rebuild(session, DocumentModel, FolderModel)
+
+    def rebuild(self, session, DocumentModel, FolderModel) -> int:
+        """Recalcula a tabela inteira (ex.: após alterar status de documentos direto no banco)."""
+        session.execute(delete(FolderModel))
+        paths = {p for (p,) in session.query(DocumentModel.folder_path).distinct()}
+        return self.refresh(session, DocumentModel, FolderModel, paths)
+
+    def refresh(self, session, DocumentModel, FolderModel, folder_paths, batch_size: int = 500) -> int:
+        """
+        Reconta os documentos das pastas informadas e atualiza os totais da
+        subárvore delas e de todos os ancestrais. Pastas que ficaram vazias
+        (sem arquivos na subárvore) saem da tabela. Retorna quantas pastas mudaram.
+        """
+        paths = {p for p in folder_paths if p}
+        if not paths:
+            return 0
+        D, F = DocumentModel, FolderModel
+        with metrics.span("folder_refresh"):
+            # contagem direta (arquivos da própria pasta) das pastas alteradas
+            direct = {path: (0, 0, 0) for path in paths}
+            ordered = sorted(paths)
+            for i in range(0, len(ordered), batch_size):
+                for path, files, size, indexed in (
+                    session.query(D.folder_path, func.count(D.id), func.coalesce(func.sum(D.file_size), 0),
+                                  func.sum(case((D.status == 'indexed', 1), else_=0)))
+                    .filter(D.folder_path.in_(ordered[i:i + batch_size]))
+                    .filter(D.status != 'missing')
+                    .group_by(D.folder_path)
+                ):
+                    direct[path] = (files, size, indexed or 0)
+
+            # os totais da subárvore mudam também em todos os ancestrais
+            levels: dict[int, set[str]] = {}
+            for path in paths:
+                for folder in ancestors(path):
+                    level = levels.setdefault(_depth(folder), set())
+                    if folder in level:
+                        break
+                    level.add(folder)
+
+            now = datetime.utcnow()
+            changed = 0
+            # das pastas mais profundas para a raiz: os filhos já estão atualizados ao somar o pai
+            for depth in sorted(levels, reverse=True):
+                level = sorted(levels[depth])
+                existing: dict[str, tuple] = {}
+                children: dict[str, tuple] = {}
+                for i in range(0, len(level), batch_size):
+                    batch = level[i:i + batch_size]
+                    for row in session.query(F.id, F.path, F.file_count, F.total_size, F.indexed_count).filter(
+                        F.path.in_(batch)
+                    ):
+                        existing[row.path] = (row.id, row.file_count, row.total_size, row.indexed_count)
+                    for parent, count, files, size, indexed in (
+                        session.query(F.parent_path, func.count(F.id), func.sum(F.tree_file_count),
+                                      func.sum(F.tree_total_size), func.sum(F.tree_indexed_count))
+                        .filter(F.parent_path.in_(batch))
+                        .group_by(F.parent_path)
+                    ):
+                        children[parent] = (count, files or 0, size or 0, indexed or 0)
+
+                inserts, updates, removed = [], [], []
+                for path in level:
+                    current = existing.get(path)
+                    if path in direct:
+                        files, size, indexed = direct[path]
+                    elif current is not None:
+                        files, size, indexed = current[1:]
+                    else:
+                        files, size, indexed = 0, 0, 0
+                    n_children, tree_files, tree_size, tree_indexed = children.get(path, (0, 0, 0, 0))
+                    if files + tree_files == 0:
+                        if current is not None:
+                            removed.append(current[0])
+                        continue
+                    parent = os.path.dirname(path)
+                    row = {
+                        'file_count': files,
+                        'total_size': size,
+                        'indexed_count': indexed,
+                        'tree_file_count': files + tree_files,
+                        'tree_total_size': size + tree_size,
+                        'tree_indexed_count': indexed + tree_indexed,
+                        'child_count': n_children,
+                        'updated_date': now,
+                    }
+                    if current is not None:
+                        updates.append({'id': current[0], **row})
+                    else:
+                        inserts.append({'path': path, 'parent_path': parent if parent != path else None,
+                                        'name': os.path.basename(path.rstrip(os.sep)) or path, **row})
+
+                for i in range(0, len(removed), batch_size):
+                    session.execute(delete(F).where(F.id.in_(removed[i:i + batch_size])))
+                if updates:
+                    session.execute(update(F), updates)
+                if inserts:
+                    session.execute(insert(F), inserts)
+                changed += len(removed) + len(updates) + len(inserts)
+            session.commit()
+        return changed
+
+    def add_indexed(self, session, DocumentModel, FolderModel, doc_ids, batch_size: int = 500):
+        """
+        Bloco da indexação (pending -> indexed/error): soma os novos indexados na
+        pasta e nos ancestrais, com custo proporcional ao bloco. Não faz commit:
+        roda na transação do bloco, para que um refresh concorrente veja o status
+        dos documentos e os totais juntos (sem contar o bloco duas vezes).
+        """
+        doc_ids = list(doc_ids)
+        per_folder: dict[str, int] = {}
+        for i in range(0, len(doc_ids), batch_size):
+            for path, count in (
+                session.query(DocumentModel.folder_path, func.count(DocumentModel.id))
+                .filter(DocumentModel.id.in_(doc_ids[i:i + batch_size]))
+                .filter(DocumentModel.status == 'indexed')
+                .group_by(DocumentModel.folder_path)
+            ):
+                if path:
+                    per_folder[path] = per_folder.get(path, 0) + count
+        if not per_folder:
+            return
+
+        tree: dict[str, int] = {}
+        for path, count in per_folder.items():
+            for folder in ancestors(path):
+                tree[folder] = tree.get(folder, 0) + count
+        t = FolderModel.__table__
+        session.execute(
+            t.update().where(t.c.path == bindparam('b_path')).values(
+                indexed_count=t.c.indexed_count + bindparam('b_direct'),
+                tree_indexed_count=t.c.tree_indexed_count + bindparam('b_tree'),
+            ),
+            [{'b_path': path, 'b_direct': per_folder.get(path, 0), 'b_tree': count} for path, count in tree.items()],
+        )
+
+    def children(self, session, FolderModel, parent: str | None = None, limit: int = 200,
+                 after: str | None = None) -> tuple[list, str | None]:
+        """Subpastas de `parent` (None = pastas raiz) por caminho; retorna (pastas, cursor da próxima página)."""
+        query = session.query(FolderModel).filter(
+            FolderModel.parent_path.is_(None) if parent is None else FolderModel.parent_path == parent
+        )
+        if after is not None:
+            query = query.filter(FolderModel.path > after)
+        rows = query.order_by(FolderModel.path).limit(limit + 1).all()
+        return rows[:limit], (rows[limit - 1].path if len(rows) > limit else None)
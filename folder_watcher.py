@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+
+from metrics import metrics
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except Exception:
+    INotify = None
+    inotify_flags = None
+
+
+class FolderWatcher:
+    """
+    Observa pastas e entrega mudanças de arquivos já agrupadas, desacoplado do app.
+    - Linux + `inotify_simple` instalado: eventos do kernel (inotify).
+    - Senão (ou se o limite de watches estourar): polling com os.scandir.
+    Eventos são "debounced": uma rajada de gravações no mesmo arquivo gera uma
+    única entrega depois de `debounce_seconds` sem novos eventos (ou no máximo
+    após `max_delay_seconds`).
+
+    on_changes(changed_paths: set[str], deleted_paths: set[str]) é chamado na
+    thread do watcher; deleted_paths pode conter pastas inteiras removidas.
+    """
+
+    def __init__(self, folders: list[str], on_changes, extensions=None,
+                 debounce_seconds: float = 2.0, max_delay_seconds: float = 30.0,
+                 poll_interval: float = 30.0, use_inotify: bool = True):
+        self.folders = [os.path.abspath(f) for f in folders]
+        self.on_changes = on_changes
+        self.extensions = {e.lower() for e in extensions} if extensions else None
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and INotify is not None
+        # caminho -> (evento mais recente: "changed"/"deleted", primeiro evento, último evento)
+        self._pending: dict[str, tuple[str, float, float]] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # -----------------------
+    # Ciclo de vida
+    # -----------------------
+    def start(self) -> "FolderWatcher":
+        self._thread = threading.Thread(target=self.run, name="folder-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def run(self):
+        if self.use_inotify:
+            try:
+                self._run_inotify()
+                return
+            except OSError as e:
+                print(f"[folder_watcher] inotify indisponível ({e}); usando polling")
+        self._run_polling()
+
+    # -----------------------
+    # Debounce
+    # -----------------------
+    def _wanted(self, path: str) -> bool:
+        return self.extensions is None or os.path.splitext(path)[1].lower() in self.extensions
+
+    def _record(self, path: str, kind: str, is_dir: bool = False):
+        if not is_dir and not self._wanted(path):
+            return
+        now = time.monotonic()
+        first = self._pending.get(path, (kind, now, now))[1]
+        self._pending[path] = (kind, first, now)
+
+    def _flush(self, force: bool = False):
+        now = time.monotonic()
+        changed, deleted = set(), set()
+        for path, (kind, first, last) in list(self._pending.items()):
+            if force or now - last >= self.debounce_seconds or now - first >= self.max_delay_seconds:
+                (deleted if kind == "deleted" else changed).add(path)
+                del self._pending[path]
+        metrics.set_gauge("watcher_pending_events", len(self._pending))
+        if changed or deleted:
+            try:
+                self.on_changes(changed, deleted)
+            except Exception as e:
+                print(f"[folder_watcher] Erro ao processar mudanças: {e}")
+
+    # -----------------------
+    # inotify
+    # -----------------------
+    def _run_inotify(self):
+        f = inotify_flags
+        mask = (f.CLOSE_WRITE | f.MODIFY | f.CREATE | f.DELETE | f.MOVED_FROM | f.MOVED_TO
+                | f.DELETE_SELF | f.MOVE_SELF)
+        with INotify() as ino:
+            dirs: dict[int, str] = {}
+
+            def watch_tree(root: str, report_files: bool):
+                stack = [root]
+                while stack:
+                    d = stack.pop()
+                    try:
+                        dirs[ino.add_watch(d, mask)] = d
+                        with os.scandir(d) as it:
+                            for entry in it:
+                                if entry.is_dir(follow_symlinks=False):
+                                    stack.append(entry.path)
+                                elif report_files:
+                                    # pasta criada/movida para dentro: arquivos já presentes não geram evento
+                                    self._record(entry.path, "changed")
+                    except FileNotFoundError:
+                        continue
+
+            for folder in self.folders:
+                watch_tree(folder, report_files=False)
+
+            while not self._stop.is_set():
+                for event in ino.read(timeout=int(self.debounce_seconds * 500)):
+                    base = dirs.get(event.wd)
+                    if base is None:
+                        continue
+                    if event.mask & (f.DELETE_SELF | f.MOVE_SELF):
+                        dirs.pop(event.wd, None)
+                        continue
+                    path = os.path.join(base, event.name)
+                    if event.mask & f.ISDIR:
+                        if event.mask & (f.CREATE | f.MOVED_TO):
+                            watch_tree(path, report_files=True)
+                        elif event.mask & (f.DELETE | f.MOVED_FROM):
+                            self._record_deleted_tree(path)
+                    elif event.mask & (f.DELETE | f.MOVED_FROM):
+                        self._record(path, "deleted")
+                    else:
+                        self._record(path, "changed")
+                self._flush()
+        self._flush(force=True)
+
+    def _record_deleted_tree(self, path: str):
+        # pasta movida/apagada: entregue como caminho de pasta em deleted_paths
+        # (DocumentProcessor.sync_paths resolve os arquivos pelo prefixo)
+        prefix = os.path.join(path, "")
+        for pending in [p for p in self._pending if p.startswith(prefix)]:
+            del self._pending[pending]
+        self._record(path, "deleted", is_dir=True)
+
+    # -----------------------
+    # Polling (fallback)
+    # -----------------------
+    def _snapshot(self) -> dict[str, tuple[float, int]]:
+        snap: dict[str, tuple[float, int]] = {}
+        stack = list(self.folders)
+        while stack:
+            d = stack.pop()
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif self._wanted(entry.name) and entry.is_file():
+                                st = entry.stat()
+                                snap[entry.path] = (st.st_mtime, st.st_size)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return snap
+
+    def _run_polling(self):
+        previous = self._snapshot()
+        next_poll = time.monotonic() + self.poll_interval
+        while not self._stop.wait(min(self.debounce_seconds, self.poll_interval) / 2):
+            if time.monotonic() >= next_poll:
+                current = self._snapshot()
+                for path, sig in current.items():
+                    if previous.get(path) != sig:
+                        self._record(path, "changed")
+                for path in previous.keys() - current.keys():
+                    self._record(path, "deleted")
+                previous = current
+                next_poll = time.monotonic() + self.poll_interval
+            self._flush()
+        self._flush(force=True)
@@ -0,0 +1,102 @@
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+from metrics import metrics
+
+# marcadores de destaque devolvidos pelo snippet() do FTS5 (trocados por <mark> após o escape do texto)
+_HL_START, _HL_END = "\x02", "\x03"
+
+
+class FullTextIndex:
+    """
+    Índice full-text SQLite FTS5 sobre Document.content_text, desacoplado do app.
+    - Tabela FTS de conteúdo externo (não duplica o texto) mantida por triggers.
+    - Tokenizador unicode61 sem acentos: "configuracao" encontra "configuração".
+    - Ranking BM25, paginação e snippet com destaque.
+    Recebe db.session por parâmetro.
+    """
+
+    def __init__(self, table: str = "document", fts_table: str = "document_fts", column: str = "content_text"):
+        self.table = table
+        self.fts_table = fts_table
+        self.column = column
+        self.available: bool | None = None  # None = esquema ainda não verificado
+
+    # -----------------------
+    # Esquema
+    # -----------------------
+    def ensure_schema(self, session) -> bool:
+        t, f, c = self.table, self.fts_table, self.column
+        try:
+            exists = session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': f}
+            ).first()
+            session.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {f} USING fts5("
+                f"{c}, content='{t}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            ))
+            session.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {f}_ai AFTER INSERT ON {t} BEGIN "
+                f"INSERT INTO {f}(rowid, {c}) VALUES (new.id, new.{c}); END"
+            ))
+            session.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {f}_ad AFTER DELETE ON {t} BEGIN "
+                f"INSERT INTO {f}({f}, rowid, {c}) VALUES ('delete', old.id, old.{c}); END"
+            ))
+            session.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {f}_au AFTER UPDATE OF {c} ON {t} BEGIN "
+                f"INSERT INTO {f}({f}, rowid, {c}) VALUES ('delete', old.id, old.{c}); "
+                f"INSERT INTO {f}(rowid, {c}) VALUES (new.id, new.{c}); END"
+            ))
+            if not exists:
+                # banco já populado: indexa o conteúdo existente uma única vez
+                session.execute(text(f"INSERT INTO {f}({f}) VALUES ('rebuild')"))
+            session.commit()
+            self.available = True
+        except Exception as e:
+            session.rollback()
+            print(f"[fulltext_index] FTS5 indisponível, usando LIKE: {e}")
+            self.available = False
+        return self.available
+
+    # -----------------------
+    # Busca
+    # -----------------------
+    @staticmethod
+    def build_match(query_text: str) -> str:
+        """Converte o texto livre em uma consulta FTS5 segura (todos os termos, entre aspas)."""
+        terms = re.findall(r"\w+", query_text or "")
+        return " ".join(f'"{term}"' for term in terms)
+
+    def search(self, session, query_text: str, limit: int = 20, offset: int = 0,
+               snippet_tokens: int = 24) -> tuple[list[tuple[int, float, Markup]], int]:
+        """
+        Retorna ([(doc_id, score_bm25, snippet_html), ...], total_de_matches) ordenados por relevância.
+        score_bm25: quanto menor, mais relevante (convenção do FTS5).
+        """
+        if self.available is None:
+            self.ensure_schema(session)
+        match = self.build_match(query_text)
+        if not self.available or not match:
+            return [], 0
+
+        f = self.fts_table
+        with metrics.span("fts_search"):
+            total = session.execute(
+                text(f"SELECT count(*) FROM {f} WHERE {f} MATCH :q"), {'q': match}
+            ).scalar() or 0
+            rows = session.execute(
+                text(
+                    f"SELECT rowid, bm25({f}), snippet({f}, 0, :hs, :he, '…', :n) "
+                    f"FROM {f} WHERE {f} MATCH :q ORDER BY bm25({f}) LIMIT :limit OFFSET :offset"
+                ),
+                {'q': match, 'hs': _HL_START, 'he': _HL_END, 'n': snippet_tokens, 'limit': limit, 'offset': offset},
+            ).all()
+        return [(doc_id, score, self._highlight(snip)) for doc_id, score, snip in rows], total
+
+    @staticmethod
+    def _highlight(snippet: str | None) -> Markup:
+        html = str(escape(snippet or ""))
+        return Markup(html.replace(_HL_START, "<mark>").replace(_HL_END, "</mark>"))
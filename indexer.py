@@ -0,0 +1,168 @@
+from datetime import datetime
+
+import numpy as np
+
+from sqlalchemy import delete, insert, update
+
+from document_processor import extract_content_worker
+from metrics import metrics
+from search_engine import chunk_vector_id, encode_embedding
+
+
+class IndexingPipeline:
+    """
+    Pipeline de indexação dos documentos pendentes, desacoplado do app.
+    - Extração em pool de processos (DocumentProcessor.extract_pool).
+    - Texto dividido em chunks sobrepostos (SearchEngine.iter_chunks), um embedding por chunk.
+    - Embeddings em lotes (SearchEngine.create_embeddings_batch).
+    - Commit a cada bloco de `commit_every` documentos: uma falha só perde o bloco atual.
+    - Após cada commit o índice FAISS é atualizado no lugar; ao final é salvo em disco.
+    Recebe db.session e as classes Document/DocumentChunk por parâmetro.
+    """
+
+    def __init__(self, document_processor, search_engine, workers: int | None = None,
+                 batch_size: int = 32, commit_every: int = 200):
+        self.document_processor = document_processor
+        self.search_engine = search_engine
+        self.workers = workers
+        self.batch_size = batch_size
+        self.commit_every = commit_every
+
+    # -----------------------
+    # Execução
+    # -----------------------
+    def run(self, session, DocumentModel, ChunkModel, on_progress=None, should_stop=None, on_block=None) -> dict:
+        """
+        Indexa os documentos `pending` (os já finalizados são ignorados, então
+        uma execução interrompida retoma de onde parou).
+        - on_progress(indexed, errors): chamado após cada bloco gravado.
+        - should_stop(): consultado entre blocos; True interrompe a execução.
+        - on_block(doc_ids): chamado com os ids do bloco (indexados e com erro) antes
+          do commit, na mesma transação (sem commit próprio), ex.: para atualizar
+          agregados por pasta junto com o status dos documentos.
+        """
+        indexed_count = 0
+        error_count = 0
+        # o índice precisa estar carregado antes das atualizações incrementais
+        self.search_engine.ensure_index(session, DocumentModel, ChunkModel)
+
+        with self.document_processor.extract_pool(self.workers) as pool:
+            chunk = self._next_chunk(session, DocumentModel, after_id=0)
+            futures = self._submit(pool, chunk)
+
+            while chunk:
+                if should_stop is not None and should_stop():
+                    for fut in futures:
+                        fut.cancel()
+                    break
+
+                # dispara a extração do próximo bloco enquanto este é codificado/gravado
+                next_chunk = self._next_chunk(session, DocumentModel, after_id=chunk[-1][0])
+                next_futures = self._submit(pool, next_chunk)
+
+                metrics.set_gauge("extract_queue_depth", sum(not f.done() for f in futures + next_futures))
+                texts: dict[int, str] = {}
+                failed: dict[int, str] = {}
+                for (doc_id, filepath, file_type), fut in zip(chunk, futures):
+                    try:
+                        _, texts[doc_id], snapshot = fut.result()
+                        metrics.merge(snapshot)
+                    except Exception as e:
+                        failed[doc_id] = str(e)
+                        print(f"Erro ao indexar {filepath}: {e}")
+                        metrics.inc("index_errors_total", type=file_type or "")
+
+                try:
+                    with metrics.span("index_block"):
+                        replaced, vector_ids, mat = self._store_block(session, DocumentModel, ChunkModel, texts, failed)
+                        if on_block is not None:
+                            on_block(list(texts) + list(failed))
+                        session.commit()
+                except Exception as e:
+                    session.rollback()
+                    print(f"[indexer] Bloco descartado ({len(chunk)} documentos): {e}")
+                else:
+                    # bloco já gravado: uma falha no índice em memória leva à reconstrução, não ao descarte
+                    self.search_engine.update_chunks(session, DocumentModel, ChunkModel, replaced, vector_ids, mat)
+                    indexed_count += len(texts)
+                    error_count += len(failed)
+                    metrics.inc("documents_indexed_total", len(texts))
+                    if on_progress is not None:
+                        on_progress(indexed_count, error_count)
+
+                chunk, futures = next_chunk, next_futures
+
+            metrics.set_gauge("extract_queue_depth", 0)
+        # grava também as remoções feitas fora do job (watcher) desde o último save
+        if indexed_count or error_count or self.search_engine.unsaved:
+            self.search_engine.save_index(session, DocumentModel, ChunkModel)
+        return {'indexed': indexed_count, 'errors': error_count}
+
+    # -----------------------
+    # Auxiliares
+    # -----------------------
+    def _next_chunk(self, session, DocumentModel, after_id: int) -> list[tuple]:
+        # keyset por id: não carrega todos os pendentes em memória
+        return (
+            session.query(DocumentModel.id, DocumentModel.filepath, DocumentModel.file_type)
+            .filter(DocumentModel.status == 'pending')
+            .filter(DocumentModel.id > after_id)
+            .order_by(DocumentModel.id)
+            .limit(self.commit_every)
+            .all()
+        )
+
+    def _submit(self, pool, chunk: list[tuple]) -> list:
+        return [pool.submit(extract_content_worker, tuple(row)) for row in chunk]
+
+    def _store_block(self, session, DocumentModel, ChunkModel, texts: dict[int, str], failed: dict[int, str]):
+        """
+        Grava chunks e status do bloco (sem commit). Retorna os ids dos vetores
+        antigos (a remover do índice) e (ids, matriz) dos novos vetores.
+        """
+        chunk_rows: list[dict] = []
+        chunk_texts: list[str] = []
+        for doc_id, text in texts.items():
+            for i, (start, end, piece) in enumerate(self.search_engine.iter_chunks([text])):
+                chunk_rows.append({'document_id': doc_id, 'chunk_index': i, 'start_char': start, 'end_char': end})
+                chunk_texts.append(piece)
+
+        vecs = self.search_engine.create_embeddings_batch(chunk_texts, batch_size=self.batch_size)
+        dtype = self.search_engine.embedding_dtype
+        for row, vec in zip(chunk_rows, vecs):
+            if vec is not None:
+                row['embedding'] = encode_embedding(vec, dtype)
+                row['embedding_dtype'] = dtype
+                row['embedding_dim'] = len(vec)
+                row['embedding_model'] = self.search_engine.model_name
+
+        # reindexação: substitui os chunks anteriores do documento
+        doc_ids = list(texts) + list(failed)
+        old_chunks = session.query(ChunkModel.document_id, ChunkModel.chunk_index).filter(
+            ChunkModel.document_id.in_(doc_ids)
+        ).all() if doc_ids else []
+        replaced = [chunk_vector_id(doc_id, chunk_index) for doc_id, chunk_index in old_chunks]
+        if old_chunks:
+            session.execute(delete(ChunkModel).where(ChunkModel.document_id.in_({d for d, _ in old_chunks})))
+        kept = [(row, vec) for row, vec in zip(chunk_rows, vecs) if vec is not None]
+        if kept:
+            session.execute(insert(ChunkModel), [row for row, _ in kept])
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                'id': doc_id,
+                'content_text': text,
+                'embeddings': None,
+                'status': 'indexed',
+                'indexed_date': now,
+            }
+            for doc_id, text in texts.items()
+        ]
+        rows += [{'id': doc_id, 'status': 'error'} for doc_id in failed]
+        if rows:
+            session.execute(update(DocumentModel), rows)
+
+        vector_ids = [chunk_vector_id(row['document_id'], row['chunk_index']) for row, _ in kept]
+        mat = np.vstack([vec for _, vec in kept]) if kept else None
+        return replaced, vector_ids, mat
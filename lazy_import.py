@@ -0,0 +1,44 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    Módulo importado só no primeiro acesso a um atributo. Usado para as
+    bibliotecas pesadas (faiss, sentence_transformers, extratores de Office/PDF),
+    que deixam de pesar no import do app, em rotas que não as usam e no CLI.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "carregado" if self._module is not None else "não carregado"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def available(module: LazyModule) -> bool:
+    """Dependência opcional: True se o módulo pode ser importado."""
+    try:
+        module._load()
+        return True
+    except Exception:
+        return False
+
+
+def preload(*modules: LazyModule):
+    """Importa agora (warm-up) os módulos informados."""
+    for module in modules:
+        module._load()
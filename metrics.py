@@ -0,0 +1,211 @@
+"""
+Instrumentação dos caminhos críticos: spans (duração), contadores e gauges,
+expostos no formato texto do Prometheus (rota /metrics) e, opcionalmente,
+como logs estruturados (uma linha JSON por span/evento no logger "pesquisa.metrics").
+
+Uso: `from metrics import metrics`
+    with metrics.span("extract", type="pdf"): ...
+    metrics.inc("extract_errors_total", type="pdf")
+    metrics.set_gauge("extract_queue_depth", 12)
+
+Desativado (padrão do objeto até `configure`), span() devolve um context
+manager no-op compartilhado e inc/set_gauge retornam na primeira linha.
+"""
+import json
+import logging
+import threading
+import time
+
+PREFIX = "pesquisa_"
+# limites (segundos) dos buckets dos histogramas de duração
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger("pesquisa.metrics")
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry: "Metrics", name: str, labels: dict):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        self.registry.observe(f"{self.name}_seconds", elapsed, **self.labels)
+        if exc_type is not None:
+            self.registry.inc(f"{self.name}_failures_total", **self.labels)
+        if self.registry.log:
+            self.registry.event(self.name, duration_ms=round(elapsed * 1000, 3),
+                                error=exc_type.__name__ if exc_type else None, **self.labels)
+        return False
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False, log: bool = False):
+        self.enabled = enabled
+        self.log = enabled and log
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = {}
+        self._gauges: dict[tuple, float] = {}
+        self._histograms: dict[tuple, list] = {}  # chave -> [contagens por bucket..., +Inf, soma]
+        self._collectors = []
+
+    def configure(self, enabled: bool, log: bool = False):
+        self.enabled = enabled
+        self.log = enabled and log
+        if self.log and not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+    def settings(self) -> dict:
+        """Configuração para recriar o registro em outro processo (pool de extração)."""
+        return {"enabled": self.enabled, "log": self.log}
+
+    # -----------------------
+    # Registro
+    # -----------------------
+    def span(self, name: str, **labels):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, labels)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    hist[i] += 1
+                    break
+            else:
+                hist[len(BUCKETS)] += 1
+            hist[-1] += value
+
+    def event(self, name: str, **fields):
+        """Log estruturado (JSON) de um evento pontual, se os logs estiverem ativos."""
+        if not self.log:
+            return
+        logger.info(json.dumps({"ts": round(time.time(), 3), "event": name,
+                                **{k: v for k, v in fields.items() if v is not None}},
+                               ensure_ascii=False, default=str))
+
+    def add_collector(self, collector):
+        """
+        collector() -> iterável de (nome, tipo "counter"|"gauge", labels, valor),
+        chamado a cada leitura do /metrics (ex.: tamanho do índice, estatísticas de cache).
+        """
+        self._collectors.append(collector)
+
+    # -----------------------
+    # Entre processos (workers de extração)
+    # -----------------------
+    def drain(self) -> dict | None:
+        """Devolve e zera o que foi registrado (o worker envia junto com o resultado)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            snapshot = {"counters": self._counters, "histograms": self._histograms}
+            self._counters, self._histograms = {}, {}
+        return snapshot
+
+    def merge(self, snapshot: dict | None):
+        if not snapshot or not self.enabled:
+            return
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, values in snapshot["histograms"].items():
+                hist = self._histograms.get(key)
+                if hist is None:
+                    self._histograms[key] = list(values)
+                else:
+                    for i, v in enumerate(values):
+                        hist[i] += v
+
+    # -----------------------
+    # Exposição (Prometheus)
+    # -----------------------
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        for collector in self._collectors:
+            try:
+                for name, kind, labels, value in collector():
+                    (counters if kind == "counter" else gauges)[_key(name, labels)] = value
+            except Exception as e:
+                print(f"[metrics] Coletor falhou: {e}")
+
+        def fmt_labels(labels: tuple, extra: tuple = ()) -> str:
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+        def group(series: dict) -> dict:
+            by_name: dict[str, list] = {}
+            for (name, labels), value in sorted(series.items()):
+                by_name.setdefault(name, []).append((labels, value))
+            return by_name
+
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            for name, items in group(series).items():
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                lines += [f"{PREFIX}{name}{fmt_labels(labels)} {value}" for labels, value in items]
+        for name, items in group(histograms).items():
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for labels, hist in items:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), hist[:-1]):
+                    cumulative += count
+                    lines.append(f"{PREFIX}{name}_bucket{fmt_labels(labels, (('le', bound),))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{fmt_labels(labels)} {round(hist[-1], 6)}")
+                lines.append(f"{PREFIX}{name}_count{fmt_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+# registro do processo; o app chama metrics.configure(...) conforme app.config
+metrics = Metrics()
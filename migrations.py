@@ -0,0 +1,120 @@
+"""
+Migrações simples de esquema/dados (o projeto usa só `db.create_all()`, sem Alembic).
+Cada função é idempotente e recebe db.session e as classes de modelo por parâmetro.
+"""
+import json
+
+import numpy as np
+from sqlalchemy import inspect, text
+
+from search_engine import encode_embedding
+
+
+def add_missing_columns(session, Model) -> list[str]:
+    """`create_all` não altera tabelas existentes: adiciona as colunas novas do modelo."""
+    engine = session.get_bind()
+    table = Model.__table__
+    existing = {col['name'] for col in inspect(engine).get_columns(table.name)}
+    added = []
+    for col in table.columns:
+        if col.name in existing:
+            continue
+        coltype = col.type.compile(dialect=engine.dialect)
+        session.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {coltype}'))
+        added.append(col.name)
+    session.commit()
+    if added:
+        print(f"[migrations] {table.name}: colunas adicionadas {', '.join(added)}")
+    return added
+
+
+def add_missing_indexes(session, Model) -> list[str]:
+    """`create_all` também não cria índices em tabelas existentes: cria os que faltam."""
+    engine = session.get_bind()
+    table = Model.__table__
+    existing = {idx['name'] for idx in inspect(engine).get_indexes(table.name)}
+    added = []
+    for index in table.indexes:
+        if index.name in existing:
+            continue
+        index.create(bind=engine, checkfirst=True)
+        added.append(index.name)
+    if added:
+        print(f"[migrations] {table.name}: índices criados {', '.join(added)}")
+    return added
+
+
+def migrate_document_embeddings(session, DocumentModel, ChunkModel, dtype: str = "float32",
+                                batch_size: int = 500) -> int:
+    """
+    Converte o vetor legado `Document.embeddings` (um por documento) em um
+    DocumentChunk cobrindo o documento inteiro, até que ele seja reindexado.
+    """
+    migrated = 0
+    while True:
+        docs = (
+            session.query(DocumentModel.id, DocumentModel.content_text, DocumentModel.embeddings)
+            .filter(DocumentModel.embeddings.isnot(None))
+            .limit(batch_size)
+            .all()
+        )
+        if not docs:
+            break
+        for doc_id, content, emb in docs:
+            session.query(ChunkModel).filter_by(document_id=doc_id).delete(synchronize_session=False)
+            try:
+                vec = np.array(json.loads(emb), dtype=np.float32)
+            except Exception:
+                continue
+            session.add(ChunkModel(
+                document_id=doc_id,
+                chunk_index=0,
+                start_char=0,
+                end_char=len(content or ""),
+                embedding=encode_embedding(vec, dtype),
+                embedding_dtype=dtype,
+                embedding_dim=len(vec),
+            ))
+        ids = [d[0] for d in docs]
+        (
+            session.query(DocumentModel)
+            .filter(DocumentModel.id.in_(ids))
+            .update({'embeddings': None}, synchronize_session=False)
+        )
+        session.commit()
+        migrated += len(docs)
+    if migrated:
+        print(f"[migrations] {migrated} embeddings legados migrados para DocumentChunk")
+    return migrated
+
+
+def migrate_json_chunk_embeddings(session, ChunkModel, dtype: str = "float32", batch_size: int = 5000) -> int:
+    """Converte embeddings de chunk gravados como JSON (texto) para blob binário."""
+    table = ChunkModel.__tablename__
+    migrated = 0
+    while True:
+        # SQL cru: o tipo LargeBinary do modelo não sabe ler os valores texto antigos
+        rows = session.execute(
+            text(f"SELECT id, embedding FROM {table} WHERE typeof(embedding) = 'text' LIMIT :n"),
+            {'n': batch_size},
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for chunk_id, emb in rows:
+            try:
+                vec = np.array(json.loads(emb), dtype=np.float32)
+                updates.append({'id': chunk_id, 'embedding': encode_embedding(vec, dtype),
+                                'dtype': dtype, 'dim': len(vec)})
+            except Exception:
+                updates.append({'id': chunk_id, 'embedding': None, 'dtype': None, 'dim': None})
+        session.execute(
+            text(f"UPDATE {table} SET embedding = :embedding, embedding_dtype = :dtype, "
+                 f"embedding_dim = :dim WHERE id = :id"),
+            updates,
+        )
+        session.commit()
+        migrated += len(rows)
+    if migrated:
+        print(f"[migrations] {migrated} embeddings de chunks convertidos de JSON para binário ({dtype})")
+    return migrated
@@ -0,0 +1,129 @@
+"""
+Servidor de embeddings compartilhado: um único processo carrega o
+SentenceTransformer e atende os demais (workers do gunicorn, CLI, jobs de
+indexação) por multiprocessing.connection, em vez de uma cópia do modelo
+por processo. Inicie com `flask --app app model-server` e configure
+MODEL_SERVER_ADDRESS/MODEL_SERVER_AUTHKEY no app.
+
+As mensagens são objetos pickle: quem conecta com a chave executa código no
+servidor. Por isso a chave é obrigatória e o servidor só escuta em localhost
+(ou socket Unix), salvo `allow_remote=True`.
+"""
+import threading
+from multiprocessing.connection import Client, Listener
+
+from lazy_import import LazyModule
+
+sentence_transformers = LazyModule("sentence_transformers")
+
+
+LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+
+def parse_address(address: str):
+    """'host:porta' ou 'porta' -> (host, porta), com localhost por padrão; outro valor é um socket Unix."""
+    if address.isdigit():
+        return "127.0.0.1", int(address)
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def _require_authkey(authkey: bytes | None) -> bytes:
+    if not authkey:
+        raise ValueError("[model_server] defina MODEL_SERVER_AUTHKEY (chave compartilhada obrigatória)")
+    return authkey
+
+
+class ModelServer:
+    """Atende ("encode" | "dimension" | "model_name", args, kwargs) com uma thread por conexão."""
+
+    def __init__(self, model_name: str, address: str, authkey: bytes, allow_remote: bool = False):
+        self.model_name = model_name
+        self.address = parse_address(address)
+        self.authkey = _require_authkey(authkey)
+        if isinstance(self.address, tuple) and self.address[0] not in LOOPBACK_HOSTS and not allow_remote:
+            raise ValueError(f"[model_server] {self.address[0]} não é localhost; use allow_remote para expor o servidor")
+        self.model = None
+        self._lock = threading.Lock()  # um encode por vez no modelo compartilhado
+
+    def serve_forever(self):
+        self.model = sentence_transformers.SentenceTransformer(self.model_name)
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"[model_server] {self.model_name} atendendo em {listener.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:  # autenticação inválida etc.
+                    print(f"[model_server] Conexão recusada: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if op == "encode":
+                        with self._lock:
+                            result = self.model.encode(*args, **kwargs)
+                    elif op == "dimension":
+                        result = self.model.get_sentence_embedding_dimension()
+                    elif op == "model_name":
+                        result = self.model_name
+                    else:
+                        raise ValueError(f"operação desconhecida: {op}")
+                    conn.send(("ok", result))
+                except Exception as e:
+                    conn.send(("error", repr(e)))
+
+
+class ModelClient:
+    """
+    Cliente do ModelServer com a mesma interface usada do SentenceTransformer
+    (encode / get_sentence_embedding_dimension). Uma conexão por thread;
+    reconecta uma vez se o servidor tiver sido reiniciado.
+    """
+
+    def __init__(self, address: str, authkey: bytes, model_name: str | None = None):
+        self.address = parse_address(address)
+        self.authkey = _require_authkey(authkey)
+        self.model_name = model_name
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = Client(self.address, authkey=self.authkey)
+        if self.model_name is not None:
+            conn.send(("model_name", (), {}))
+            _, served = conn.recv()
+            if served != self.model_name:
+                conn.close()
+                raise RuntimeError(f"[model_server] servidor usa {served}, esperado {self.model_name}")
+        return conn
+
+    def _call(self, op: str, *args, **kwargs):
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.send((op, args, kwargs))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                self._local.conn = None
+                if attempt:
+                    raise
+        if status != "ok":
+            raise RuntimeError(f"[model_server] {result}")
+        return result
+
+    def encode(self, sentences, **kwargs):
+        return self._call("encode", sentences, **kwargs)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._call("dimension")
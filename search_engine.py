@@ -1,29 +1,164 @@
 import json
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterable, Iterator
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import undefer
+
+from lazy_import import LazyModule, preload
+from metrics import metrics
+from model_server import ModelClient
+from query_cache import TTLCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos (a checagem do meta continua valendo)
+    fcntl = None
+
+# importados no primeiro uso (modelo/índice), não no import do app
+faiss = LazyModule("faiss")
+sentence_transformers = LazyModule("sentence_transformers")
+
+# id no FAISS = document_id * CHUNK_ID_STRIDE + chunk_index
+# (mapeia o vetor de volta ao documento sem tabela auxiliar e permite remover um documento por faixa de ids)
+CHUNK_ID_STRIDE = 1 << 20
+
+
+# flat = força bruta exata; ivf_flat/ivf_pq = listas invertidas (treino por amostra); hnsw = grafo
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+
+# formatos de armazenamento do embedding no banco (blob); int8 = quantização escalar
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+_INT8_SCALE = 127.0  # vetores normalizados (L2) têm componentes em [-1, 1]
+
+
+@contextmanager
+def _file_lock(path: str, shared: bool = False):
+    """Trava entre processos (web, watcher, workers) em torno da leitura/gravação do índice."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def chunk_vector_id(document_id: int, chunk_index: int) -> int:
+    return document_id * CHUNK_ID_STRIDE + chunk_index
+
+
+def encode_embedding(vec, dtype: str = "float32") -> bytes:
+    vec = np.asarray(vec, dtype=np.float32)
+    if dtype == "int8":
+        return np.clip(np.rint(vec * _INT8_SCALE), -127, 127).astype(np.int8).tobytes()
+    return vec.astype(dtype).tobytes()
+
+
+def decode_embeddings(blob: bytes, dtype: str, dim: int) -> np.ndarray:
+    """Blob (um ou vários vetores concatenados) -> matriz float32 (n, dim)."""
+    mat = np.frombuffer(blob, dtype=dtype).reshape(-1, dim)
+    if dtype == "int8":
+        return mat.astype(np.float32) / _INT8_SCALE
+    return mat.astype(np.float32)
+
 
 class SearchEngine:
     """
     Engine de embeddings + FAISS, desacoplado do app.
     - NÃO importa db nem models do app.
-    - Recebe db.session e a classe Document por parâmetro.
+    - Recebe db.session e as classes Document/DocumentChunk por parâmetro.
+    - Com `index_path`, o índice é salvo em disco e carregado com mmap; o
+      "fingerprint" (count, max id) dos chunks indexados detecta divergência
+      com o banco e só então força a reconstrução.
+    - `index_type` escolhe o índice (ver INDEX_TYPES). Tipos IVF são treinados com
+      uma amostra e ficam "flat" enquanto não há vetores suficientes para treinar;
+      `nprobe`/`ef_search` ajustam precisão x latência (ver evaluate_recall).
     """
 
-    def __init__(self, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+                 chunk_size: int = 500, chunk_overlap: int = 100,
+                 index_path: str | None = None, reload_check_seconds: float = 5.0,
+                 index_type: str = "flat", nlist: int | None = None, hnsw_m: int = 32,
+                 pq_m: int | None = None, pq_nbits: int = 8, nprobe: int = 16, ef_search: int = 64,
+                 train_sample: int = 100_000, embedding_dtype: str = "float32",
+                 model_server: str | None = None, model_server_authkey: bytes = b"",
+                 query_cache_size: int = 1024, query_cache_ttl: float | None = 3600,
+                 result_cache_size: int = 1024, result_cache_ttl: float | None = 300):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type inválido: {index_type} (use {', '.join(INDEX_TYPES)})")
+        if embedding_dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"embedding_dtype inválido: {embedding_dtype} (use {', '.join(EMBEDDING_DTYPES)})")
+        self.model_name = model_name
+        # modelo carregado no primeiro encode (ou warm_up); com `model_server`
+        # ("host:porta" ou socket Unix) os embeddings vêm do ModelServer compartilhado
+        self.model_server = model_server
+        self.model_server_authkey = model_server_authkey
+        self._model = None
+        self._model_lock = threading.Lock()
+        # trechos em caracteres; o MiniLM trunca em ~128 tokens (~500 caracteres)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = min(chunk_overlap, chunk_size // 2)
+        self.index_path = index_path
+        self.reload_check_seconds = reload_check_seconds
+        self.index_type = index_type
+        self.nlist = nlist  # None = automático (~4*sqrt(n))
+        self.hnsw_m = hnsw_m
+        self.pq_m = pq_m  # None = ~8 dimensões por subquantizador
+        self.pq_nbits = pq_nbits
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.train_sample = train_sample
+        self.embedding_dtype = embedding_dtype
         self.index = None
-        self.doc_ids: list[int] = []
+        self.index_kind = None  # tipo efetivo do índice carregado
         self.dim = None
-        self._built = False
+        self.version = 0  # incrementado a cada alteração do índice
+        self._loaded = False
+        self._stale = False  # índice contém vetores que não puderam ser removidos (HNSW)
+        self.unsaved = False  # alterações em memória (update_chunks) ainda não gravadas por save_index
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search")
+        # caches de consulta: embedding por (modelo, texto); top-k por (modelo, versão do índice, ...)
+        self.embedding_cache = TTLCache(query_cache_size, query_cache_ttl)
+        self.result_cache = TTLCache(result_cache_size, result_cache_ttl)
+        self._disk_mtime = None  # mtime do meta.json carregado/salvo por este processo
+        self._last_disk_check = 0.0
 
     # -----------------------
     # Embeddings
     # -----------------------
-    def _encode(self, texts):
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    if self.model_server:
+                        self._model = ModelClient(self.model_server, self.model_server_authkey, self.model_name)
+                    else:
+                        self._model = sentence_transformers.SentenceTransformer(self.model_name)
+        return self._model
+
+    def warm_up(self):
+        """Carrega o modelo (ou conecta ao servidor) e o faiss antes da primeira consulta."""
+        self._encode(["warm-up"])
+        preload(faiss)
+
+    def _encode(self, texts, batch_size: int = 32):
         # normaliza L2 -> pronto para cos_sim (e IP com vetores normalizados)
-        return self.model.encode(texts, normalize_embeddings=True)
+        with metrics.span("encode_batch"):
+            vecs = self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+        metrics.inc("encode_texts_total", len(texts))
+        return vecs
 
     def create_embeddings(self, text: str):
         if not text or not text.strip():
@@ -35,64 +170,471 @@ class SearchEngine:
             print(f"Erro ao criar embeddings: {e}")
             return None
 
+    def create_embeddings_batch(self, texts: list[str], batch_size: int = 32) -> list:
+        """
+        Gera embeddings para vários textos em lotes (`SentenceTransformer.encode`).
+        Retorna uma lista alinhada com `texts`; textos vazios ficam como None.
+        Erros do modelo são propagados: o bloco da indexação volta atrás e
+        os documentos continuam pending (não ficam "indexados" sem vetores).
+        """
+        out: list = [None] * len(texts)
+        pos = [i for i, t in enumerate(texts) if t and t.strip()]
+        if not pos:
+            return out
+        vecs = self._encode([texts[i] for i in pos], batch_size=batch_size)
+        for i, vec in zip(pos, vecs):
+            out[i] = vec
+        return out
+
+    def query_embedding(self, query_text: str):
+        """Embedding da consulta, reaproveitado entre buscas repetidas e os snippets de cada resultado."""
+        key = (self.model_name, query_text)
+        vec = self.embedding_cache.get(key)
+        if vec is None:
+            vec = self.create_embeddings(query_text)
+            if vec is not None:
+                self.embedding_cache.put(key, vec)
+        return vec
+
+    def cache_stats(self) -> dict:
+        return {
+            'embeddings': self.embedding_cache.stats(),
+            'results': self.result_cache.stats(),
+            'index_version': self.version,
+        }
+
+    # -----------------------
+    # Chunks
+    # -----------------------
+    def split_chunks(self, text: str) -> list[tuple[int, int]]:
+        """
+        Divide o texto em trechos sobrepostos de até `chunk_size` caracteres,
+        cortando preferencialmente em espaço. Retorna [(início, fim), ...].
+        """
+        return [(start, end) for start, end, _ in self.iter_chunks([text or ""])]
+
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[tuple[int, int, str]]:
+        """
+        Versão em streaming do split_chunks: consome os trechos gerados pelo
+        extrator (unidos por "\n") e gera (início, fim, texto) mantendo em
+        memória só a janela atual.
+        """
+        size, overlap = self.chunk_size, self.chunk_overlap
+        step = size - overlap
+        segments = iter(segments)
+        buf, base, start = "", 0, 0  # buf = texto a partir da posição absoluta `base`
+        first, exhausted = True, False
+        while True:
+            # garante o texto até start + chunk_size (+1 para saber se é o fim)
+            while not exhausted and base + len(buf) <= start + size:
+                seg = next(segments, None)
+                if seg is None:
+                    exhausted = True
+                else:
+                    buf += seg if first else "\n" + seg
+                    first = False
+            n = base + len(buf) if exhausted else None
+            if n is not None and start >= n:
+                break
+            end = start + size if n is None else min(start + size, n)
+            if n is None or end < n:
+                cut = buf.rfind(" ", start + step - base, end - base)
+                if cut >= 0 and cut + base > start:
+                    end = cut + base
+            piece = buf[start - base:end - base]
+            if piece.strip():
+                yield start, end, piece
+            if n is not None and end >= n:
+                break
+            start = max(end - overlap, start + 1)
+            if start - base > len(buf) // 2:  # descarta o já consumido (amortizado)
+                buf, base = buf[start - base:], start
+
     # -----------------------
     # Índice FAISS
     # -----------------------
     def reset_index(self):
-        self.index = None
-        self.doc_ids = []
-        self.dim = None
-        self._built = False
+        with self._lock:
+            self.index = None
+            self.index_kind = None
+            self.dim = None
+            self.version += 1
+
+    def _nlist_for(self, n: int) -> int:
+        return self.nlist or max(1, min(65536, int(4 * np.sqrt(max(n, 1)))))
+
+    def _pq_m_for(self, dim: int) -> int:
+        if self.pq_m:
+            return self.pq_m
+        for m in range(max(1, dim // 8), 0, -1):
+            if dim % m == 0:
+                return m
+        return 1
+
+    def _index_kind_for(self, n: int) -> str:
+        """Tipo efetivo para n vetores: IVF só quando há pontos suficientes para treinar (~39 por centróide)."""
+        if self.index_type == "ivf_flat" and n < 39 * self._nlist_for(n):
+            return "flat"
+        if self.index_type == "ivf_pq" and n < 39 * max(self._nlist_for(n), 1 << self.pq_nbits):
+            return "flat"
+        return self.index_type
+
+    def _new_index(self, dim: int, kind: str = "flat", n: int = 0):
+        metric = faiss.METRIC_INNER_PRODUCT
+        if kind == "hnsw":
+            return faiss.IndexIDMap2(faiss.IndexHNSWFlat(dim, self.hnsw_m, metric))
+        if kind == "ivf_flat":
+            return faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, self._nlist_for(n), metric)
+        if kind == "ivf_pq":
+            return faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, self._nlist_for(n),
+                                    self._pq_m_for(dim), self.pq_nbits, metric)
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
 
-    def build_index(self, session, DocumentModel):
-        docs = (
-            session.query(DocumentModel)
+    def _apply_search_params(self, index, nprobe: int | None = None, ef_search: int | None = None):
+        if index is None:
+            return
+        inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+        if isinstance(inner, faiss.IndexIVF):
+            inner.nprobe = nprobe or self.nprobe
+        elif isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = ef_search or self.ef_search
+
+    def fingerprint(self, session, DocumentModel, ChunkModel) -> list[int]:
+        """(quantidade, maior id) dos chunks que devem estar no índice."""
+        count, max_id = (
+            session.query(func.count(ChunkModel.id), func.max(ChunkModel.id))
+            .join(DocumentModel, DocumentModel.id == ChunkModel.document_id)
+            .filter(DocumentModel.status == 'indexed')
+            .filter(ChunkModel.embedding.isnot(None))
+            .one()
+        )
+        return [int(count or 0), int(max_id or 0)]
+
+    def _chunk_rows(self, session, DocumentModel, ChunkModel):
+        return (
+            session.query(ChunkModel.document_id, ChunkModel.chunk_index, ChunkModel.embedding,
+                          ChunkModel.embedding_dtype, ChunkModel.embedding_dim)
+            .join(DocumentModel, DocumentModel.id == ChunkModel.document_id)
             .filter(DocumentModel.status == 'indexed')
-            .filter(DocumentModel.embeddings.isnot(None))
-            .all()
+            .filter(ChunkModel.embedding.isnot(None))
         )
-        vecs, ids = [], []
-        for d in docs:
+
+    def _iter_vector_batches(self, rows, batch_rows: int):
+        """
+        Percorre linhas de `_chunk_rows` e gera (ids int64, matriz float32 normalizada).
+        Os blobs de cada lote são concatenados e lidos de uma vez com np.frombuffer.
+        """
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                yield from self._decode_batch(batch)
+                batch = []
+        if batch:
+            yield from self._decode_batch(batch)
+
+    def _decode_batch(self, batch):
+        groups: dict[tuple[str, int], list] = {}
+        for doc_id, chunk_index, blob, dtype, dim in batch:
+            groups.setdefault((dtype or "float32", dim), []).append((doc_id, chunk_index, blob))
+        for (dtype, dim), rows in groups.items():
+            if not dim:
+                continue
             try:
-                emb = d.embeddings
-                if isinstance(emb, str):
-                    emb = np.array(json.loads(emb), dtype=np.float32)
+                mat = decode_embeddings(b"".join(blob for _, _, blob in rows), dtype, dim)
+            except Exception as e:
+                print(f"[search_engine] Embeddings inválidos ignorados ({len(rows)}): {e}")
+                continue
+            faiss.normalize_L2(mat)
+            ids = np.fromiter((chunk_vector_id(d, c) for d, c, _ in rows), dtype=np.int64, count=len(rows))
+            yield ids, mat
+
+    def _sample_vectors(self, session, DocumentModel, ChunkModel, n: int, batch_rows: int = 10000):
+        rows = self._chunk_rows(session, DocumentModel, ChunkModel).order_by(func.random()).limit(n)
+        batches = [mat for _, mat in self._iter_vector_batches(rows, batch_rows)]
+        return np.vstack(batches) if batches else None
+
+    def build_index(self, session, DocumentModel, ChunkModel, batch_rows: int = 10000):
+        with metrics.span("index_build"):
+            self._build_index(session, DocumentModel, ChunkModel, batch_rows)
+
+    def _build_index(self, session, DocumentModel, ChunkModel, batch_rows: int):
+        n = self.fingerprint(session, DocumentModel, ChunkModel)[0]
+        kind = self._index_kind_for(n)
+        index = None
+        if kind in ("ivf_flat", "ivf_pq"):
+            sample = self._sample_vectors(session, DocumentModel, ChunkModel, self.train_sample, batch_rows)
+            index = self._new_index(sample.shape[1], kind, n)
+            index.train(sample)
+            del sample
+
+        rows = self._chunk_rows(session, DocumentModel, ChunkModel).order_by(ChunkModel.id).yield_per(batch_rows)
+        for ids, mat in self._iter_vector_batches(rows, batch_rows):
+            if index is None:
+                index = self._new_index(mat.shape[1], kind, n)
+            if mat.shape[1] == index.d:
+                index.add_with_ids(mat, ids)
+
+        with self._lock:
+            self._apply_search_params(index)
+            self.index = index
+            self.index_kind = kind if index is not None else None
+            self.dim = index.d if index is not None else None
+            self.version += 1
+            self._loaded = True
+            self._stale = False
+
+    def ensure_index(self, session, DocumentModel, ChunkModel):
+        """Carrega o índice do disco (ou reconstrói se ausente/divergente) e recarrega se outro processo o salvou."""
+        with self._lock:
+            if not self._loaded:
+                if not self.load_index(session, DocumentModel, ChunkModel):
+                    self.build_index(session, DocumentModel, ChunkModel)
+                    self.save_index(session, DocumentModel, ChunkModel)
+                return
+            if not self.index_path or time.monotonic() - self._last_disk_check < self.reload_check_seconds:
+                return
+            self._last_disk_check = time.monotonic()
+            mtime = self._meta_mtime()
+            if mtime is not None and mtime != self._disk_mtime:
+                if not self.load_index(session, DocumentModel, ChunkModel):
+                    self.build_index(session, DocumentModel, ChunkModel)
+                    self.save_index(session, DocumentModel, ChunkModel)
+
+    def _meta_path(self) -> str:
+        return f"{self.index_path}.meta.json"
+
+    def _lock_path(self) -> str:
+        return f"{self.index_path}.lock"
+
+    def _meta_mtime(self):
+        try:
+            return os.stat(self._meta_path()).st_mtime_ns
+        except OSError:
+            return None
+
+    def load_index(self, session, DocumentModel, ChunkModel) -> bool:
+        """Lê o índice salvo (mmap, exceto IVF). Retorna False se não existir ou divergir do banco/modelo."""
+        if not self.index_path or not os.path.exists(self._meta_path()):
+            return False
+        with self._lock, _file_lock(self._lock_path(), shared=True):
+            return self._load_index(session, DocumentModel, ChunkModel)
+
+    def _load_index(self, session, DocumentModel, ChunkModel) -> bool:
+        try:
+            mtime = self._meta_mtime()
+            with open(self._meta_path(), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model") != self.model_name:
+                print(f"[search_engine] Índice salvo com outro modelo ({meta.get('model')}); reconstruindo.")
+                return False
+            if meta.get("configured_type", "flat") != self.index_type:
+                print(f"[search_engine] Índice salvo como {meta.get('configured_type')}; reconstruindo como {self.index_type}.")
+                return False
+            fingerprint = self.fingerprint(session, DocumentModel, ChunkModel)
+            # o meta grava também quantos vetores o arquivo tem: um índice desatualizado
+            # salvo por outro processo não passa só por causa do fingerprint do banco
+            if meta.get("fingerprint") != fingerprint or meta.get("ntotal", 0) != fingerprint[0]:
+                print("[search_engine] Índice em disco divergente do banco; reconstruindo.")
+                return False
+            index = None
+            if meta.get("dim"):
+                # IVF lido com mmap vira OnDiskInvertedLists somente leitura: add/remove falhariam
+                if meta.get("index_type") in ("ivf_flat", "ivf_pq"):
+                    index = faiss.read_index(self.index_path)
                 else:
-                    emb = np.array(emb, dtype=np.float32)
-                if emb.ndim == 1:
-                    vecs.append(emb)
-                    ids.append(d.id)
-            except Exception:
-                pass
-
-        if not vecs:
-            self.reset_index()
+                    try:
+                        index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP)
+                    except Exception:
+                        index = faiss.read_index(self.index_path)
+            if (index.ntotal if index is not None else 0) != fingerprint[0]:
+                print("[search_engine] Arquivo do índice não corresponde ao meta; reconstruindo.")
+                return False
+        except Exception as e:
+            print(f"[search_engine] Falha ao carregar índice {self.index_path}: {e}")
+            return False
+
+        with self._lock:
+            self._apply_search_params(index)
+            self.index = index
+            self.index_kind = meta.get("index_type")
+            self.dim = meta.get("dim")
+            self.version = max(self.version + 1, int(meta.get("version", 0)))
+            self._disk_mtime = mtime
+            self._last_disk_check = time.monotonic()
+            self._loaded = True
+            self.unsaved = False
+        return True
+
+    def save_index(self, session, DocumentModel, ChunkModel):
+        """
+        Grava índice + meta (fingerprint do banco e total de vetores) de forma atômica
+        ao lado do banco. Se outro processo salvou depois da última leitura, ou se o
+        índice em memória não tem os vetores do banco, reconstrói antes de gravar
+        em vez de sobrescrever o arquivo com um índice desatualizado.
+        """
+        if not self.index_path:
             return
+        with self._lock, _file_lock(self._lock_path()):
+            fingerprint = self.fingerprint(session, DocumentModel, ChunkModel)
+            mtime = self._meta_mtime()
+            ntotal = int(self.index.ntotal) if self.index is not None else 0
+            if (mtime is not None and mtime != self._disk_mtime) or ntotal != fingerprint[0]:
+                print("[search_engine] Índice em memória desatualizado (outro processo salvou); reconstruindo.")
+                self._stale = True
+            # vetores órfãos (HNSW não remove) ou corpus já grande o bastante para treinar o IVF
+            if self._stale or (
+                self.index is not None and self.index_kind == "flat"
+                and self._index_kind_for(self.index.ntotal) != "flat"
+            ):
+                self.build_index(session, DocumentModel, ChunkModel)
+            meta = {
+                "model": self.model_name,
+                "configured_type": self.index_type,
+                "index_type": self.index_kind,
+                "dim": self.dim,
+                "version": self.version,
+                "ntotal": int(self.index.ntotal) if self.index is not None else 0,
+                "fingerprint": fingerprint,
+            }
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+                if self.index is not None:
+                    faiss.write_index(self.index, self.index_path + ".tmp")
+                    os.replace(self.index_path + ".tmp", self.index_path)
+                with open(self._meta_path() + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+                os.replace(self._meta_path() + ".tmp", self._meta_path())
+                self._disk_mtime = self._meta_mtime()
+                self.unsaved = False
+            except Exception as e:
+                print(f"[search_engine] Falha ao salvar índice {self.index_path}: {e}")
+
+    def remove_chunks(self, vector_ids):
+        """Remove vetores pelos ids (`chunk_vector_id`) numa única passada pelo índice."""
+        with self._lock:
+            if self.index is None or len(vector_ids) == 0:
+                return
+            if self.index_kind == "hnsw":
+                self._stale = True
+                return
+            ids = np.asarray(vector_ids, dtype=np.int64)
+            self.index.remove_ids(faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids)))
+            self.version += 1
 
-        mat = np.vstack(vecs).astype('float32')
-        self.dim = mat.shape[1]
+    def update_chunks(self, session, DocumentModel, ChunkModel, removed=(), ids=(), mat=None):
+        """
+        Aplica no índice em memória uma alteração já gravada no banco (vetores
+        removidos e adicionados). Se falhar, reconstrói o índice a partir do
+        banco em vez de deixá-lo divergente. Não grava o arquivo: fica `unsaved`
+        até o próximo save_index.
+        """
+        if len(removed) or len(ids):
+            self.unsaved = True
+        try:
+            self.remove_chunks(removed)
+            self.add_chunks(ids, mat)
+        except Exception as e:
+            print(f"[search_engine] Falha ao atualizar o índice ({e}); reconstruindo a partir do banco.")
+            try:
+                self.build_index(session, DocumentModel, ChunkModel)
+            except Exception as e:
+                print(f"[search_engine] Falha ao reconstruir o índice: {e}")
+                with self._lock:
+                    self._stale = True  # nova tentativa no próximo save_index
+
+    def add_chunks(self, ids, mat):
+        """Adiciona vetores de chunks (ids de `chunk_vector_id`) ao índice em memória."""
+        if mat is None or len(ids) == 0:
+            return
+        mat = np.ascontiguousarray(mat, dtype=np.float32)
         faiss.normalize_L2(mat)
+        with self._lock:
+            if self.index is None:
+                # IVF precisa de treino: começa flat e é promovido no próximo save_index
+                self.index_kind = "hnsw" if self.index_type == "hnsw" else "flat"
+                self.index = self._new_index(mat.shape[1], self.index_kind)
+                self._apply_search_params(self.index)
+                self.dim = mat.shape[1]
+            self.index.add_with_ids(mat, np.asarray(ids, dtype=np.int64))
+            self.version += 1
 
-        self.index = faiss.IndexFlatIP(self.dim)
-        self.index.add(mat)
-        self.doc_ids = ids
-        self._built = True
+    def evaluate_recall(self, session, DocumentModel, ChunkModel, k: int = 10, n_queries: int = 200,
+                        nprobe: int | None = None, ef_search: int | None = None, batch_rows: int = 10000) -> dict:
+        """
+        Mede o recall@k do índice atual contra a busca exata (força bruta em lotes,
+        sem carregar todos os vetores), usando vetores de chunks como consultas.
+        nprobe/ef_search permitem testar parâmetros sem alterar os atuais.
+        """
+        self.ensure_index(session, DocumentModel, ChunkModel)
+        if self.index is None or self.index.ntotal == 0:
+            return {"index_type": self.index_kind, "ntotal": 0}
+
+        queries = self._sample_vectors(session, DocumentModel, ChunkModel, n_queries, batch_rows)
+        k = min(k, self.index.ntotal)
+
+        heap = faiss.ResultHeap(len(queries), k, keep_max=True)
+        exact_seconds = 0.0
+        rows = self._chunk_rows(session, DocumentModel, ChunkModel).yield_per(batch_rows)
+        for ids, mat in self._iter_vector_batches(rows, batch_rows):
+            t0 = time.perf_counter()
+            heap.add_result(queries @ mat.T, np.broadcast_to(ids, (len(queries), len(ids))))
+            exact_seconds += time.perf_counter() - t0
+        heap.finalize()
+
+        with self._lock:
+            self._apply_search_params(self.index, nprobe, ef_search)
+            try:
+                t0 = time.perf_counter()
+                _, ann_ids = self.index.search(queries, k)
+                ann_seconds = time.perf_counter() - t0
+            finally:
+                self._apply_search_params(self.index)
+
+        hits = sum(len(set(a[a >= 0]) & set(e[e >= 0])) for a, e in zip(ann_ids, heap.I))
+        return {
+            "index_type": self.index_kind,
+            "configured_type": self.index_type,
+            "ntotal": int(self.index.ntotal),
+            "k": k,
+            "queries": len(queries),
+            "nprobe": nprobe or self.nprobe,
+            "ef_search": ef_search or self.ef_search,
+            "recall_at_k": round(hits / (len(queries) * k), 4),
+            "ann_ms_per_query": round(1000 * ann_seconds / len(queries), 4),
+            "flat_ms_per_query": round(1000 * exact_seconds / len(queries), 4),
+        }
 
     # -----------------------
     # Busca
     # -----------------------
-    def vector_search(self, query_text: str, session, DocumentModel, limit: int = 10):
-        """Retorna lista de Document com atributo .similarity_score (0..1)."""
+    def vector_search(self, query_text: str, session, DocumentModel, ChunkModel, limit: int = 10):
+        """
+        Busca nos vetores dos chunks e agrega por documento (melhor chunk de cada um).
+        Retorna lista de Document com .similarity_score (0..1) e .best_chunk (início, fim).
+        """
         if not query_text or not query_text.strip():
             return []
+        self.ensure_index(session, DocumentModel, ChunkModel)
+        hits = self.search_vectors(query_text, limit)
+        return self._load_hits(session, DocumentModel, ChunkModel, hits)
 
-        if self.index is None or not self._built or self.index.ntotal == 0:
-            self.build_index(session, DocumentModel)
-
+    def search_vectors(self, query_text: str, limit: int = 10) -> list[tuple[int, float, int]]:
+        """
+        Parte da busca vetorial que não usa o banco (encode + FAISS), segura para rodar
+        em outra thread. O índice deve ter sido carregado antes (ensure_index).
+        Retorna [(doc_id, score, chunk_index), ...] do mais para o menos similar.
+        """
         if self.index is None or self.index.ntotal == 0:
             return []
 
-        q = self.create_embeddings(query_text)
+        # a versão muda a cada alteração do índice: resultados antigos deixam de casar
+        key = (self.model_name, self.version, self.index_kind, self.nprobe, self.ef_search, query_text, limit)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return list(cached)
+
+        q = self.query_embedding(query_text)
         if q is None:
             return []
 
@@ -104,48 +646,143 @@ class SearchEngine:
             print(f"[search_engine] Dimensão consulta {q.shape[1]} != índice {self.dim}. Reindexe com o mesmo modelo.")
             return []
 
-        k = min(limit, self.index.ntotal)
-        scores, idxs = self.index.search(q, k)
+        # vários chunks do mesmo documento podem ocupar o top-k: amplia k até ter `limit` documentos
+        best: dict[int, tuple[float, int]] = {}
+        with self._lock:
+            ntotal = self.index.ntotal
+            k = min(limit * 4, ntotal)
+            while True:
+                with metrics.span("faiss_search", index=self.index_kind):
+                    scores, ids = self.index.search(q, k)
+                best.clear()
+                for score, vid in zip(scores[0], ids[0]):
+                    if vid < 0:
+                        continue
+                    doc_id, chunk_index = divmod(int(vid), CHUNK_ID_STRIDE)
+                    if doc_id not in best:
+                        best[doc_id] = (float(score), chunk_index)
+                if len(best) >= limit or k >= ntotal:
+                    break
+                k = min(k * 4, ntotal)
+            fresh = self.version == key[1]  # o índice pode ter mudado durante o encode
+        hits = [(doc_id, score, chunk_index) for doc_id, (score, chunk_index) in list(best.items())[:limit]]
+        if fresh:
+            self.result_cache.put(key, tuple(hits))
+        return hits
+
+    def hybrid_search(self, query_text: str, session, DocumentModel, ChunkModel, lexical_search,
+                      limit: int = 10, k: int = 50, rrf_k: int = 60,
+                      lexical_weight: float = 1.0, vector_weight: float = 1.0):
+        """
+        Busca híbrida: top-k léxico e top-k vetorial em paralelo, fundidos por
+        Reciprocal Rank Fusion ponderado (score = Σ peso / (rrf_k + posição)).
+        - lexical_search(k): função do app que devolve ids de Document ranqueados
+          (roda na thread atual, com a sessão do app).
+        .similarity_score é o score fundido normalizado para 0..1.
+        """
+        if not query_text or not query_text.strip():
+            return []
+        self.ensure_index(session, DocumentModel, ChunkModel)
+        vector_future = self._executor.submit(self.search_vectors, query_text, k)
+        lexical_ids = lexical_search(k)
+        vector_hits = vector_future.result()
+
+        fused: dict[int, float] = {}
+        for rank, doc_id in enumerate(lexical_ids, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + lexical_weight / (rrf_k + rank)
+        chunk_of: dict[int, int] = {}
+        for rank, (doc_id, _, chunk_index) in enumerate(vector_hits, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + vector_weight / (rrf_k + rank)
+            chunk_of[doc_id] = chunk_index
 
+        best_possible = (lexical_weight + vector_weight) / (rrf_k + 1)
+        ranked = sorted(fused, key=fused.get, reverse=True)[:limit]
+        hits = [(doc_id, fused[doc_id] / best_possible, chunk_of.get(doc_id)) for doc_id in ranked]
+        return self._load_hits(session, DocumentModel, ChunkModel, hits)
+
+    def _load_hits(self, session, DocumentModel, ChunkModel, hits: list[tuple[int, float, int | None]]):
+        """Carrega os Documents dos hits (na ordem) com .similarity_score e .best_chunk."""
+        if not hits:
+            return []
+        with metrics.span("db_fetch"):
+            return self._fetch_hits(session, DocumentModel, ChunkModel, hits)
+
+    def _fetch_hits(self, session, DocumentModel, ChunkModel, hits):
+        keys = [(doc_id, chunk_index) for doc_id, _, chunk_index in hits if chunk_index is not None]
+        spans = {}
+        if keys:
+            spans = {
+                (doc_id, chunk_index): (start, end)
+                for doc_id, chunk_index, start, end in session.query(
+                    ChunkModel.document_id, ChunkModel.chunk_index, ChunkModel.start_char, ChunkModel.end_char
+                ).filter(tuple_(ChunkModel.document_id, ChunkModel.chunk_index).in_(keys))
+            }
+
+        # uma consulta IN para todos os hits (texto incluído: snippets/RAG usam o trecho); a ordem vem dos hits
+        docs = {
+            doc.id: doc
+            for doc in session.query(DocumentModel)
+            .options(undefer(DocumentModel.content_text))
+            .filter(DocumentModel.id.in_([doc_id for doc_id, _, _ in hits]))
+        }
         out = []
-        for score, idx in zip(scores[0], idxs[0]):
-            if 0 <= idx < len(self.doc_ids):
-                doc_id = self.doc_ids[idx]
-                doc = session.get(DocumentModel, doc_id)
-                if doc is not None:
-                    try:
-                        doc.similarity_score = float(score)
-                    except Exception:
-                        doc.similarity_score = None
-                    out.append(doc)
+        for doc_id, score, chunk_index in hits:
+            doc = docs.get(doc_id)
+            if doc is not None:
+                doc.similarity_score = score
+                doc.best_chunk = spans.get((doc_id, chunk_index))
+                out.append(doc)
         return out
 
     # -----------------------
     # Snippet relevante (opcional)
     # -----------------------
-    def find_relevant_snippet(self, query_text: str, document_text: str, max_length: int = 300) -> str:
+    def find_relevant_snippet(self, query_text: str, document_text: str, max_length: int = 300,
+                              span: tuple[int, int] | None = None, max_windows: int = 48) -> str:
+        """
+        Janela de até 3 frases mais similar à consulta.
+        - span: trecho (início, fim) do melhor chunk da busca vetorial; limita as janelas a ele.
+        - max_windows: teto de janelas avaliadas (amostradas uniformemente), todas
+          codificadas numa única chamada em lote; o embedding da consulta vem do cache.
+        """
+        with metrics.span("snippet"):
+            return self._find_relevant_snippet(query_text, document_text, max_length, span, max_windows)
+
+    def _find_relevant_snippet(self, query_text: str, document_text: str, max_length: int,
+                               span: tuple[int, int] | None, max_windows: int) -> str:
         if not document_text or not query_text:
             return document_text[:max_length] if document_text else ""
 
-        sentences = re.split(r'[.!?]+', document_text)
+        region = document_text
+        if span is not None:
+            start, end = span
+            if document_text[start:end].strip():
+                region = document_text[start:end]
+
+        sentences = re.split(r'[.!?]+', region)
         sentences = [s.strip() for s in sentences if s.strip()]
         if not sentences:
-            return document_text[:max_length]
+            return region[:max_length]
 
-        qv = self.create_embeddings(query_text)
+        qv = self.query_embedding(query_text)
         if qv is None:
-            return document_text[:max_length]
+            return region[:max_length]
 
-        best = ("", -1.0)
-        for i in range(len(sentences)):
-            end = min(i + 3, len(sentences))
-            snippet = ". ".join(sentences[i:end])
+        starts = range(len(sentences))
+        if len(sentences) > max_windows:
+            starts = np.linspace(0, len(sentences) - 1, max_windows).astype(int)
+        windows = []
+        for i in starts:
+            snippet = ". ".join(sentences[i:i + 3])
             if len(snippet) > max_length:
                 snippet = snippet[:max_length] + "..."
-            sv = self.create_embeddings(snippet)
-            if sv is not None:
-                denom = (np.linalg.norm(qv) * np.linalg.norm(sv)) or 1.0
-                sim = float(np.dot(qv, sv) / denom)
-                if sim > best[1]:
-                    best = (snippet, sim)
-        return best[0] or document_text[:max_length]
+            windows.append(snippet)
+
+        try:
+            mat = np.asarray(self._encode(windows), dtype=np.float32)
+        except Exception as e:
+            print(f"Erro ao criar embeddings do snippet: {e}")
+            return region[:max_length]
+        # vetores já normalizados: produto interno = cosseno
+        sims = mat @ np.asarray(qv, dtype=np.float32)
+        return windows[int(np.argmax(sims))] or region[:max_length]
@@ -0,0 +1,14 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import db  # mesmos modelos do app, como em benchmarks/run.py
+
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
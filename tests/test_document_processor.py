@@ -0,0 +1,117 @@
+import os
+
+from app import Document
+from document_processor import DocumentProcessor
+
+
+def _write(path, text="conteúdo"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return str(path)
+
+
+def _touch_later(path):
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+
+def _status(session):
+    session.expire_all()
+    return {os.path.basename(d.filepath): (d.status, d.duplicate_of) for d in session.query(Document)}
+
+
+def _ids(session, filename):
+    return [doc_id for (doc_id,) in session.query(Document.id).filter(Document.filename == filename)]
+
+
+def test_scan_reconciles_added_changed_and_missing(tmp_path, session):
+    root = tmp_path / "docs"
+    a = _write(root / "a.txt", "a")
+    b = _write(root / "sub" / "b.txt", "b")
+    processor = DocumentProcessor()
+
+    result = processor.scan_folder(str(root), session, Document)
+    assert result.added == 2
+    assert result.folders == {str(root), str(root / "sub")}
+
+    session.query(Document).update({"status": "indexed"})
+    session.commit()
+    result = processor.scan_folder(str(root), session, Document)
+    assert (result.added, result.unchanged, result.changed_ids, result.missing_ids) == (0, 2, [], [])
+    assert result.folders == set()
+
+    _write(a, "a alterado")
+    _touch_later(a)
+    os.remove(b)
+    result = processor.scan_folder(str(root), session, Document)
+    assert result.unchanged == 0
+    assert len(result.changed_ids) == 1 and len(result.missing_ids) == 1
+    assert _status(session) == {"a.txt": ("pending", None), "b.txt": ("missing", None)}
+
+    # o arquivo que reaparece volta para pending
+    _write(b, "b")
+    result = processor.scan_folder(str(root), session, Document)
+    assert result.changed_ids == _ids(session, "b.txt")
+    assert _status(session)["b.txt"] == ("pending", None)
+
+
+
+def test_scan_prefix_is_case_sensitive_and_stops_at_separator(tmp_path, session):
+    _write(tmp_path / "Docs" / "a.txt", "a")
+    _write(tmp_path / "docs" / "b.txt", "b")
+    _write(tmp_path / "docs2" / "c.txt", "c")
+    processor = DocumentProcessor()
+    for folder in ("Docs", "docs", "docs2"):
+        processor.scan_folder(str(tmp_path / folder), session, Document)
+
+    # a pasta "docs" esvaziada não marca como missing os arquivos de "Docs" nem de "docs2"
+    os.remove(tmp_path / "docs" / "b.txt")
+    result = processor.scan_folder(str(tmp_path / "docs"), session, Document)
+    assert result.missing_ids == _ids(session, "b.txt")
+    assert _status(session) == {"a.txt": ("pending", None), "b.txt": ("missing", None), "c.txt": ("pending", None)}
+
+
+def test_identical_copies_share_one_primary(tmp_path, session):
+    root = tmp_path / "docs"
+    first = _write(root / "1.txt", "mesmo conteúdo")
+    _write(root / "2.txt", "mesmo conteúdo")
+    processor = DocumentProcessor()
+
+    result = processor.scan_folder(str(root), session, Document)
+    (id1,), (id2,) = _ids(session, "1.txt"), _ids(session, "2.txt")
+    assert result.duplicate_ids == [id2]
+    assert _status(session) == {"1.txt": ("pending", None), "2.txt": ("duplicate", id1)}
+
+    # a cópia em uso é apagada: a outra é promovida e volta para a fila
+    os.remove(first)
+    result = processor.scan_folder(str(root), session, Document)
+    assert result.missing_ids == [id1]
+    assert id2 in result.changed_ids
+    assert result.folders == {str(root)}
+    assert _status(session) == {"1.txt": ("missing", None), "2.txt": ("pending", None)}
+
+    # a versão original reaparece: vira cópia da promovida, já indexada
+    session.query(Document).filter(Document.id == id2).update({"status": "indexed"})
+    session.commit()
+    _write(first, "mesmo conteúdo")
+    result = processor.scan_folder(str(root), session, Document)
+    assert result.duplicate_ids == [id1]
+    assert _status(session) == {"1.txt": ("duplicate", id2), "2.txt": ("indexed", None)}
+
+
+def test_sync_paths_drops_files_under_deleted_folder(tmp_path, session):
+    root = tmp_path / "docs"
+    _write(root / "sub" / "a.txt", "a")
+    _write(root / "sub" / "b.txt", "b")
+    _write(root / "c.txt", "c")
+    processor = DocumentProcessor()
+    processor.scan_folder(str(root), session, Document)
+
+    for name in ("a.txt", "b.txt"):
+        os.remove(root / "sub" / name)
+    os.rmdir(root / "sub")
+    result = processor.sync_paths([], [str(root / "sub")], session, Document)
+    assert len(result.missing_ids) == 2
+    assert result.folders == {str(root / "sub")}
+    assert _status(session)["c.txt"] == ("pending", None)
@@ -0,0 +1,114 @@
+import os
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import Document, DocumentChunk, Folder
+from benchmarks.stub_encoder import StubEncoder
+from document_processor import DocumentProcessor
+from folder_tree import FolderTree
+from indexer import IndexingPipeline
+from search_engine import SearchEngine
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _snapshot(session):
+    session.expire_all()
+    return {
+        f.path: (f.file_count, f.total_size, f.indexed_count, f.tree_file_count, f.tree_total_size,
+                 f.tree_indexed_count, f.child_count, f.parent_path)
+        for f in session.query(Folder)
+    }
+
+
+def _scan(processor, tree, session, root):
+    result = processor.scan_folder(str(root), session, Document)
+    tree.refresh(session, Document, Folder, result.folders)
+    return result
+
+
+def test_incremental_refresh_matches_rebuild(tmp_path, session):
+    root = tmp_path / "docs"
+    for i, rel in enumerate(("a.txt", "x/b.txt", "x/c.txt", "x/y/d.txt", "z/e.txt")):
+        _write(root / rel, str(i) * (i + 1))
+    processor, tree = DocumentProcessor(), FolderTree()
+    _scan(processor, tree, session, root)
+    assert _snapshot(session)[str(root / "x")][3] == 3
+
+    # alterações: arquivo novo, arquivo apagado, pasta esvaziada e cópia (duplicate)
+    _write(root / "x" / "y" / "f.txt", "novo")
+    os.remove(root / "z" / "e.txt")
+    _write(root / "x" / "g.txt", "0")
+    incremental = _scan(processor, tree, session, root)
+    assert str(root / "z") in incremental.folders
+    snapshot = _snapshot(session)
+    assert str(root / "z") not in snapshot
+
+    tree.rebuild(session, Document, Folder)
+    assert _snapshot(session) == snapshot
+    # cópias contam como arquivos da pasta; só os ausentes (missing) saem dos totais
+    assert snapshot[str(root)][3:7] == (6, 1 + 2 + 3 + 4 + 4 + 1, 0, 1)
+
+
+def test_add_indexed_updates_folder_and_ancestors(tmp_path, session):
+    root = tmp_path / "docs"
+    _write(root / "a.txt", "a")
+    _write(root / "x" / "b.txt", "b")
+    processor, tree = DocumentProcessor(), FolderTree()
+    _scan(processor, tree, session, root)
+
+    doc_ids = [doc_id for (doc_id,) in session.query(Document.id)]
+    session.query(Document).update({"status": "indexed"})
+    tree.add_indexed(session, Document, Folder, doc_ids)
+    session.commit()
+    snapshot = _snapshot(session)
+    assert (snapshot[str(root / "x")][2], snapshot[str(root / "x")][5]) == (1, 1)
+    assert (snapshot[str(root)][2], snapshot[str(root)][5]) == (1, 2)
+    assert snapshot[str(tmp_path)][5] == 2
+
+    tree.rebuild(session, Document, Folder)
+    assert _snapshot(session) == snapshot
+
+
+def test_add_indexed_is_discarded_with_the_block(tmp_path, session):
+    root = tmp_path / "docs"
+    _write(root / "a.txt", "a")
+    processor, tree = DocumentProcessor(), FolderTree()
+    _scan(processor, tree, session, root)
+    before = _snapshot(session)
+
+    session.query(Document).update({"status": "indexed"})
+    tree.add_indexed(session, Document, Folder, [doc_id for (doc_id,) in session.query(Document.id)])
+    session.rollback()
+    assert _snapshot(session) == before
+
+
+def test_refresh_after_block_commit_does_not_double_count(tmp_path, session):
+    root = tmp_path / "docs"
+    for i in range(5):
+        _write(root / f"d{i % 2}" / f"{i}.txt", f"documento {i} " * 20)
+    processor, tree = DocumentProcessor(), FolderTree()
+    _scan(processor, tree, session, root)
+
+    # o watcher reconta as pastas logo após o commit do primeiro bloco (outra sessão)
+    def refresh_from_watcher(_):
+        with Session(session.get_bind()) as other:
+            tree.refresh(other, Document, Folder, {str(root / "d0"), str(root / "d1")})
+
+    event.listen(session, "after_commit", refresh_from_watcher, once=True)
+    engine = SearchEngine(model_name="stub", index_path=None)
+    engine._model = StubEncoder(16)
+    pipeline = IndexingPipeline(processor, engine, workers=1, commit_every=2)
+    stats = pipeline.run(session, Document, DocumentChunk,
+                         on_block=lambda doc_ids: tree.add_indexed(session, Document, Folder, doc_ids))
+
+    assert stats == {"indexed": 5, "errors": 0}
+    snapshot = _snapshot(session)
+    assert snapshot[str(root)][5] == 5
+    tree.rebuild(session, Document, Folder)
+    assert _snapshot(session) == snapshot
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from search_engine import SearchEngine, chunk_vector_id  # noqa: E402
+
+
+def _engine(path, kind, ntotal):
+    engine = SearchEngine(model_name="stub", index_path=str(path), index_type=kind, nlist=8)
+    # sem banco: (quantidade de vetores, maior id) que o índice salvo deve ter
+    engine.fingerprint = lambda *args: [ntotal, 0]
+    return engine
+
+
+def _vectors(n, dim=16, seed=0):
+    mat = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(mat)
+    return mat
+
+
+@pytest.mark.parametrize("kind", ["ivf_flat", "ivf_pq"])
+def test_ivf_index_accepts_updates_after_reload(tmp_path, kind):
+    path = tmp_path / "documents.faiss"
+    vectors = _vectors(2000)
+    ids = np.array([chunk_vector_id(doc_id, 0) for doc_id in range(1, len(vectors) + 1)], dtype=np.int64)
+
+    engine = _engine(path, kind, len(vectors))
+    engine.pq_nbits = 4  # treino com 2000 pontos
+    index = engine._new_index(vectors.shape[1], kind, len(vectors))
+    index.train(vectors)
+    index.add_with_ids(vectors, ids)
+    engine.index, engine.index_kind, engine.dim = index, kind, vectors.shape[1]
+    engine.save_index(None, None, None)
+
+    reloaded = _engine(path, kind, len(vectors))
+    assert reloaded.load_index(None, None, None)
+    assert reloaded.index.ntotal == len(vectors)
+
+    new_ids = [chunk_vector_id(doc_id, 0) for doc_id in range(5001, 5011)]
+    reloaded.add_chunks(new_ids, _vectors(10, seed=1))
+    reloaded.remove_chunks(ids[:20])
+    assert reloaded.index.ntotal == len(vectors) + 10 - 20